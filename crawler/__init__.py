@@ -14,7 +14,7 @@ class Crawler(object):
     def start_async(self):
         self.workers = [
             self.worker_factory(worker_id, self.config, self.frontier)
-            # Create four worker threads
+            # any number of worker threads; they share the frontier's per-host queues
             for worker_id in range(self.config.threads_count)]
         for worker in self.workers:
             worker.start()
@@ -23,10 +23,7 @@ class Crawler(object):
         self.start_async()
         while True:
             sleep(10)
-            if not self.frontier.to_be_downloaded[0].qsize() \
-                and not self.frontier.to_be_downloaded[1].qsize() \
-                and not self.frontier.to_be_downloaded[2].qsize() \
-                and not self.frontier.to_be_downloaded[3].qsize():
+            if self.frontier.is_empty():
                 print("ALL QUEUES EMPTY, TERMINATING.")
                 raise KeyboardInterrupt
         self.join()
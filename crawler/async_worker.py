@@ -0,0 +1,165 @@
+"""An asyncio alternative to the thread-per-slot Worker.
+
+    crawler = Crawler(config, restart, worker_factory=AsyncWorker)
+
+Each AsyncWorker is one thread running an event loop that keeps up to TASKS_PER_WORKER
+pages in flight at once: the downloads share a pool of kept-alive connections to the
+cache server, and the parsing of every page (scraper.parse_page) runs in a pool of
+processes, so the event loop only does the bookkeeping. Politeness is still the
+frontier's: a host only ever has one URL checked out at a time, and isn't handed out
+again before its crawl delay is up, so a single worker (threads_count = 1) is enough.
+"""
+import asyncio
+import cbor
+from threading import Thread
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+from utils import get_logger
+from utils.response import Response
+import scraper
+
+TASKS_PER_WORKER = 1000 # most pages one worker has in flight at once
+MAX_CONNECTIONS = 100 # most open connections to the cache server per worker
+SCRAPE_PROCESSES = None # processes parsing pages (None: one per core)
+POLL_INTERVAL = 0.1 # longest the worker sleeps before asking the frontier for a URL again
+DOWNLOAD_TIMEOUT = 60 # seconds
+# the status of a page the cache server couldn't be asked for: its own "Spacetime server failure",
+# which (like the rest of its 600s) the scraper takes as a failed download
+CACHE_SERVER_FAILURE = 602
+
+
+class AsyncDownloader:
+    """Downloads pages through the cache server (like utils.download), reusing its connections"""
+    def __init__(self, config, logger, max_connections=MAX_CONNECTIONS):
+        self.host, self.port = config.cache_server
+        self.user_agent = config.user_agent
+        self.logger = logger
+        self.idle = list() # open (reader, writer) pairs not in use
+        self.connections = asyncio.Semaphore(max_connections)
+
+    async def _request(self, connection, target):
+        """sends a GET over a connection and reads the response.
+        returns its status, its body and whether the connection can be reused"""
+        reader, writer = connection
+        writer.write((f"GET {target} HTTP/1.1\r\n"
+                      f"Host: {self.host}:{self.port}\r\n"
+                      f"Connection: keep-alive\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("the cache server closed the connection")
+        status = int(status_line.split()[1])
+        headers = dict()
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                body += await reader.readexactly(size + 2) # the chunk and its \r\n (the last one's ends the body)
+                del body[-2:]
+                if not size:
+                    break
+        else: # the body runs until the server closes the connection
+            body = await reader.read()
+            keep_alive = False
+        return status, bytes(body), keep_alive
+
+    async def download(self, url):
+        target = "/?" + urlencode([("q", f"{url}"), ("u", f"{self.user_agent}")])
+        status, body = CACHE_SERVER_FAILURE, b""
+        async with self.connections:
+            for attempt in range(2): # an idle connection the server has since closed gets one retry
+                reused = bool(self.idle)
+                connection = None
+                try:
+                    connection = self.idle.pop() if reused else await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), DOWNLOAD_TIMEOUT)
+                    status, body, keep_alive = await asyncio.wait_for(self._request(connection, target), DOWNLOAD_TIMEOUT)
+                except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    if connection is not None:
+                        connection[1].close()
+                    if reused:
+                        continue
+                    self.logger.error(f"Download of {url} failed: {e!r}")
+                    break
+                if keep_alive:
+                    self.idle.append(connection)
+                else:
+                    connection[1].close()
+                break
+        try:
+            if body:
+                return Response(cbor.loads(body))
+        except (EOFError, ValueError):
+            pass
+        self.logger.error(f"Spacetime Response error {status} with url {url}.")
+        return Response({
+            "error": f"Spacetime Response error {status} with url {url}.",
+            "status": status,
+            "url": url})
+
+    async def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+class AsyncWorker(Thread):
+    def __init__(self, worker_id, config, frontier):
+        self.logger = get_logger(f"Worker-{worker_id}", "Worker")
+        self.config = config
+        self.frontier = frontier
+        self.worker_id = worker_id
+        super().__init__(daemon=True)
+
+    def run(self):
+        asyncio.run(self.crawl())
+
+    async def crawl(self):
+        """hands the frontier's URLs out to crawl tasks until there are none left"""
+        downloader = AsyncDownloader(self.config, self.logger)
+        slots = asyncio.Semaphore(TASKS_PER_WORKER)
+        tasks = set()
+        with ProcessPoolExecutor(max_workers=SCRAPE_PROCESSES) as pool:
+            while True:
+                await slots.acquire()
+                tbd_url, wait = self.frontier.poll_tbd_url()
+                if tbd_url is None:
+                    slots.release()
+                    if wait is None:
+                        self.logger.info("Frontier is empty. Stopping Crawler.")
+                        break
+                    await asyncio.sleep(min(wait, POLL_INTERVAL))
+                    continue
+                task = asyncio.create_task(self.crawl_url(tbd_url, downloader, pool))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: slots.release())
+            await asyncio.gather(*tasks)
+        await downloader.close()
+
+    async def crawl_url(self, tbd_url, downloader, pool):
+        try:
+            resp = await downloader.download(tbd_url)
+            if resp:
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                parsed = None
+                if resp.raw_response and resp.raw_response.content:
+                    parsed = await asyncio.get_running_loop().run_in_executor(
+                        pool, scraper.parse_page, tbd_url, resp.raw_response.content)
+                for scraped_url in scraper.scraper(tbd_url, resp, self.worker_id, parsed):
+                    self.frontier.add_url(scraped_url)
+        except Exception as e:
+            self.logger.error(f"Failed to crawl {tbd_url}: {e!r}")
+        finally:
+            self.frontier.mark_url_complete(tbd_url)
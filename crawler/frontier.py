@@ -1,27 +1,45 @@
 import os
-import shelve
 import re
+import time
+import math
+import heapq
 
-from threading import Thread, RLock, Lock
-from queue import Queue, Empty
+from threading import Condition
+from collections import deque
 from urllib.parse import urlparse
 from utils import get_logger, get_urlhash, normalize
+from crawler import store
+from crawler.store import FrontierStore
+import scraper
 from scraper import is_valid, forbidden_crawls
 
-ics_lock = Lock()
-cs_lock = Lock()
-informatics_lock = Lock()
-stat_lock = Lock()
+def get_host(url: str) -> str:
+    """scheme + netloc of a url (e.g. https://www.ics.uci.edu), the key politeness is kept by"""
+    return urlparse(url)._replace(path='', params='', query='', fragment='').geturl()
 
 class Frontier(object):
+    """
+    URLs to be downloaded, queued per host.
+
+    Hosts with queued URLs sit in a heap ordered by the time each is next allowed to be
+    fetched from, so any worker takes a URL from whichever host is ready first. A host is
+    checked out while one of its URLs is being crawled, and goes back into the heap once
+    that URL is marked complete, not to be fetched from again before its delay
+    (config.time_delay, or its robots.txt Crawl-delay if that's longer) is up.
+    """
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        # 0:ics, 1:cs, 2:informatics, 3:stat
-        self.to_be_downloaded = {0:Queue(), 1:Queue(), 2:Queue(), 3:Queue()}
+        self.hosts = dict() # host -> deque of its URLs to be downloaded
+        self.ready = list() # heap of (time the host can next be fetched from, host) for hosts with queued URLs
+        self.scheduled = set() # hosts in ready
+        self.next_fetch = dict() # host -> time it can next be fetched from
+        self.checked_out = dict() # URL being crawled -> its host
+        self.busy_hosts = set() # hosts with a URL being crawled
+        self.lock = Condition()
         self.seen_domains = set()
         self.skipped_urls = set()
-         
+
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
@@ -31,9 +49,9 @@ class Frontier(object):
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
-        # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+            store.delete(self.config.save_file)
+        # Load existing save file (replaying its log), or create one if it does not exist.
+        self.save = FrontierStore(self.config.save_file)
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
@@ -47,7 +65,7 @@ class Frontier(object):
     def determine_domain(self, url: str) -> int:
         """
         Return an integer associated with the domain
-        
+
         0 : ics.uci.edu
         1 : cs.uci.edu
         2 : informatics.uci.edu
@@ -64,101 +82,107 @@ class Frontier(object):
         ''' This function can be overridden for alternate saving techniques. '''
         total_count = len(self.save)
         tbd_count = 0
-        for url, completed in self.save.values():
-            domain_int = self.determine_domain(url)
-            if not completed and is_valid(url):
-                match domain_int:    
-                    case 0:
-                        self.to_be_downloaded[domain_int].put(url)
-                    case 1:
-                        self.to_be_downloaded[domain_int].put(url)
-                    case 2:
-                        self.to_be_downloaded[domain_int].put(url)
-                    case 3:
-                        self.to_be_downloaded[domain_int].put(url)
-                    case 4:
-                        pass
+        for url in self.save.pending():
+            if is_valid(url):
+                if self.determine_domain(url) != 4:
+                    self._enqueue(url)
                 tbd_count += 1
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
             f"total urls discovered.")
 
-    def get_tbd_url(self, domain_int: int):
-        # domain_int is worker_id of thread
-        try:
-            match domain_int:    
-                case 0:
-                        return self.to_be_downloaded[domain_int].get()
-                case 1:
-                        return self.to_be_downloaded[domain_int].get()
-                case 2:
-                        return self.to_be_downloaded[domain_int].get()
-                case 3:
-                        return self.to_be_downloaded[domain_int].get()
-                case 4:
+    def crawl_delay(self, host: str) -> float:
+        """seconds to wait between two fetches from a host"""
+        return max(self.config.time_delay, scraper.robots_cache.crawl_delay(host) or 0)
+
+    def _schedule(self, host: str) -> None:
+        """puts a host with queued URLs back in the heap (lock must be held)"""
+        if host not in self.scheduled and self.hosts.get(host):
+            heapq.heappush(self.ready, (self.next_fetch.get(host, 0), host))
+            self.scheduled.add(host)
+            self.lock.notify()
+
+    def _enqueue(self, url: str) -> None:
+        host = get_host(url)
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = deque()
+            self.hosts[host].append(url)
+            if host not in self.busy_hosts:
+                self._schedule(host)
+
+    def poll_tbd_url(self):
+        """
+        Checks out the next URL of a host that can be fetched from right now, without waiting.
+        Returns (url, 0), or (None, seconds until a host can be fetched from) if none can yet
+        (math.inf if that depends on the URLs being crawled), or (None, None) once nothing is
+        queued and nothing is being crawled (that could add more)
+        """
+        with self.lock:
+            if self.ready:
+                when, host = self.ready[0]
+                wait = when - time.time()
+                if wait > 0:
+                    return None, wait
+                heapq.heappop(self.ready)
+                self.scheduled.discard(host)
+                url = self.hosts[host].popleft()
+                if scraper.robots_cache.is_stale(host) and not url.endswith('/robots.txt'):
+                    # its robots.txt is fetched again before anything else of the host
+                    self.hosts[host].appendleft(url)
+                    url = normalize(host + '/robots.txt')
+                    scraper.robots_cache.mark_refreshing(host)
+                self.checked_out[url] = host
+                self.busy_hosts.add(host)
+                return url, 0
+            if self.checked_out:
+                return None, math.inf
+            return None, None
+
+    def get_tbd_url(self, worker_id=None):
+        """
+        Checks out the next URL of whichever host can be fetched from soonest, waiting until it can.
+        Returns None once there's nothing left to crawl (see poll_tbd_url)
+        """
+        with self.lock:
+            while True:
+                url, wait = self.poll_tbd_url()
+                if url is not None:
+                    return url
+                if wait is None:
+                    self.lock.notify_all() # so the other waiting workers stop too
                     return None
-        except IndexError:
-            return None
+                self.lock.wait(None if wait == math.inf else wait)
 
-    def write_tbd(self, domain_int: int) -> None:
-        if not (0 <= domain_int <= 3): return
-        with open(f"tbd{domain_int}.txt", "a+") as tbd_file:
-            tbd_file.write(f"{self.to_be_downloaded[domain_int].qsize()}\n")
+    def close(self) -> None:
+        """commits whatever the save file hasn't yet"""
+        self.save.close()
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return not self.ready and not self.checked_out
 
     def add_url(self, url):
-        self.write_tbd(self.determine_domain(url))
-        domain = urlparse(url)._replace(path='', params='', query='', fragment='').geturl()
+        domain = get_host(url)
         domain_int = self.determine_domain(url)
         if domain not in self.seen_domains:
             # if we haven't seen this domain before, we should get the robots.txt file from it first (if it exists)
             self.seen_domains.add(domain) # add domain to seen_domains
             self.save[get_urlhash(normalize(domain + '/robots.txt'))] = (normalize(domain + '/robots.txt'), False)
-            self.save.sync()
             self.save[get_urlhash(normalize(domain))] = (normalize(domain), False)
-            self.save.sync()
-            match domain_int:
-                case 0:
-                    with ics_lock:
-                        self.to_be_downloaded[domain_int].put(url)
-                        self.to_be_downloaded[domain_int].put(normalize(domain + '/robots.txt'))
-                case 1:
-                    with cs_lock:
-                        self.to_be_downloaded[domain_int].put(url)
-                        self.to_be_downloaded[domain_int].put(normalize(domain + '/robots.txt'))
-                case 2:
-                    with informatics_lock:
-                        self.to_be_downloaded[domain_int].put(url)
-                        self.to_be_downloaded[domain_int].put(normalize(domain + '/robots.txt'))
-                case 3:
-                    with stat_lock:
-                        self.to_be_downloaded[domain_int].put(url)
-                        self.to_be_downloaded[domain_int].put(normalize(domain + '/robots.txt'))
-                case 4:
-                    pass
-            return 
+            if domain_int != 4:
+                self._enqueue(normalize(domain + '/robots.txt'))
+                self._enqueue(url)
+            return
         if domain in forbidden_crawls: return # if the entire domain has been barred from crawling, don't bother.
         url = normalize(url)
         if url in forbidden_crawls: return # if this specifc path is blacklisted, don't bother
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            match domain_int:    
-                case 0:
-                    with ics_lock:
-                        self.to_be_downloaded[domain_int].put(url)
-                case 1:
-                    with cs_lock:
-                        self.to_be_downloaded[domain_int].put(url)
-                case 2:
-                    with informatics_lock:
-                        self.to_be_downloaded[domain_int].put(url)
-                case 3:
-                    with stat_lock:
-                        self.to_be_downloaded[domain_int].put(url)
-                case 4:
-                    pass          
-    
+        if urlhash not in self.save: # checked against the in-memory seen set, see FrontierStore
+            self.save[urlhash] = (url, False) # committed with the next group (see FrontierStore)
+            if domain_int != 4:
+                self._enqueue(url)
+
     def mark_url_complete(self, url):
         urlhash = get_urlhash(url)
         if urlhash not in self.save:
@@ -166,4 +190,11 @@ class Frontier(object):
             self.logger.error(
                 f"Completed url {url}, but have not seen it before.")
         self.save[urlhash] = (url, True)
-        self.save.sync()
+        with self.lock:
+            host = self.checked_out.pop(url, None)
+            if host is not None:
+                self.busy_hosts.discard(host)
+                # the host's politeness delay starts once its last fetch is done
+                self.next_fetch[host] = time.time() + self.crawl_delay(host)
+                self._schedule(host)
+            self.lock.notify_all()
@@ -0,0 +1,88 @@
+"""A compact set of the URLs the frontier has seen, for deduplicating extracted links.
+
+Instead of the URLs (or their 64 character hex hashes) it keeps a 64-bit fingerprint of each
+(the first 16 hex digits of its hash), in one flat open-addressed table of uint64s that's kept
+at most half full, so a URL costs 8-16 bytes rather than the couple of hundred a set of
+strings would. Two URLs sharing a fingerprint makes the second look seen, but at 64 bits
+that's about a one in a million chance over ten million URLs.
+
+The table is saved and loaded as is (see save and load), so reloading it is one read.
+"""
+import os
+import struct
+from array import array
+
+INITIAL_CAPACITY = 1 << 16 # slots; always a power of two
+HEADER = struct.Struct("<Q") # number of fingerprints
+
+
+def fingerprint(urlhash: str) -> int:
+    """the 64-bit fingerprint of a URL, from its (hex) hash. never 0, which marks an empty slot"""
+    return int(urlhash[:16], 16) or 1
+
+
+def _slot(table: array, value: int) -> int:
+    """the slot of table value is in, or the empty slot it would go in (linear probing)"""
+    mask = len(table) - 1 # the length is a power of two
+    i = value & mask # the hash is already uniformly distributed
+    while table[i] and table[i] != value:
+        i = (i + 1) & mask
+    return i
+
+
+class SeenSet:
+    """
+    Adds have to be made one at a time (the FrontierStore's lock sees to that), but lookups
+    take no lock: a lookup reads self.table once, and growing the table builds the new one
+    in full before it replaces the old, so a lookup always sees a whole table
+    """
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.table = array('Q', bytes(8 * capacity))
+        self.count = 0
+
+    def add(self, urlhash: str) -> None:
+        value = fingerprint(urlhash)
+        table = self.table
+        i = _slot(table, value)
+        if not table[i]:
+            table[i] = value
+            self.count += 1
+            if 2 * self.count > len(table):
+                self._grow()
+
+    def _grow(self) -> None:
+        table = array('Q', bytes(16 * len(self.table)))
+        for value in self.table:
+            if value:
+                table[_slot(table, value)] = value
+        self.table = table
+
+    def __contains__(self, urlhash: str) -> bool:
+        table = self.table
+        return bool(table[_slot(table, fingerprint(urlhash))])
+
+    def __len__(self) -> int:
+        return self.count
+
+    def save(self, path: str) -> None:
+        """atomically writes the table out"""
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(self.count))
+            self.table.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SeenSet":
+        """reads a table written by save (an empty set if there isn't one)"""
+        seen = cls()
+        if not os.path.exists(path):
+            return seen
+        with open(path, "rb") as f:
+            (seen.count,) = HEADER.unpack(f.read(HEADER.size))
+            table = array('Q')
+            table.frombytes(f.read())
+        seen.table = table
+        return seen
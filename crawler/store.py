@@ -0,0 +1,159 @@
+"""Append-only persistence for the frontier.
+
+The URLs the frontier has yet to download are kept in memory, along with a compact
+set of every URL it's seen (see seen.py), and every change to them is appended to a log
+as a line of
+
+    A|C <tab> urlhash <tab> url
+
+(A for a URL to be downloaded, C for a completed one). Changes are group committed:
+they're buffered and written + fsynced together once GROUP_COMMIT_RECORDS have
+piled up or the oldest has waited GROUP_COMMIT_INTERVAL seconds, so a crawl discovering
+thousands of URLs a second doesn't pay a disk flush for each. A crash loses at most the
+last group, which just gets rediscovered.
+
+Restarting replays the log, where a URL's last record wins. Compacting the log (once it's
+COMPACTION_RATIO times longer than the number of URLs left to download, and on close)
+saves the seen set next to it, then rewrites the log with just the URLs left to download,
+so a restart reads the seen set in one go and replays a short log on top of it.
+"""
+import os
+import time
+from threading import Thread, Lock, Event
+from crawler.seen import SeenSet
+
+GROUP_COMMIT_RECORDS = 1000
+GROUP_COMMIT_INTERVAL = 0.2 # seconds
+COMPACTION_RATIO = 2 # log records per URL left to download at which the log gets compacted
+COMPACTION_MIN_RECORDS = 100_000 # shorter logs are never worth compacting
+ADDED = "A"
+COMPLETED = "C"
+
+
+def _seen_path(path):
+    return path + ".seen"
+
+
+def delete(path) -> None:
+    """deletes a store's log and seen set"""
+    for file_path in (path, _seen_path(path)):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+class FrontierStore:
+    """
+    Persistent frontier state, used like the shelve the frontier used to keep
+    (store[urlhash] = (url, completed), urlhash in store...), backed by an append-only log.
+    Only the URLs left to download are kept whole; the rest are in the seen set
+    """
+    def __init__(self, path, group_records=GROUP_COMMIT_RECORDS, group_interval=GROUP_COMMIT_INTERVAL):
+        self.path = path
+        self.group_records = group_records
+        self.group_interval = group_interval
+        self.urls = dict() # urlhash -> url, of the URLs left to download
+        self.seen = SeenSet.load(_seen_path(path)) # every URL added
+        self.records = 0 # records in the log
+        self.buffer = list() # records not yet written
+        self.buffered_at = None # when the oldest of them was
+        self.lock = Lock()
+        self._replay()
+        self.log = open(self.path, "a", encoding="utf-8")
+        self.closed = Event()
+        self.flusher = Thread(target=self._flush_periodically, daemon=True)
+        self.flusher.start()
+
+    def _replay(self) -> None:
+        """loads the log's state into memory"""
+        if not os.path.exists(self.path):
+            return
+        complete = 0 # bytes of the log up to its last whole record
+        with open(self.path, "rb") as log:
+            for line in log:
+                if not line.endswith(b"\n"): # a group cut short by a crash
+                    break
+                complete += len(line)
+                record = line.decode("utf-8", errors="replace").rstrip("\n").split("\t", 2)
+                if len(record) != 3: # a url with a line break in it, say
+                    continue
+                kind, urlhash, url = record
+                self._apply(urlhash, url, kind == COMPLETED)
+                self.records += 1
+        if complete < os.path.getsize(self.path): # so the next group isn't appended onto the partial record
+            os.truncate(self.path, complete)
+
+    def _apply(self, urlhash, url, completed) -> None:
+        self.seen.add(urlhash)
+        if completed:
+            self.urls.pop(urlhash, None)
+        else:
+            self.urls[urlhash] = url
+
+    def __setitem__(self, urlhash, value) -> None:
+        url, completed = value
+        with self.lock:
+            self._apply(urlhash, url, completed)
+            self.buffer.append(f"{COMPLETED if completed else ADDED}\t{urlhash}\t{url}\n")
+            if self.buffered_at is None:
+                self.buffered_at = time.time()
+            if len(self.buffer) >= self.group_records:
+                self._flush()
+
+    def __contains__(self, urlhash) -> bool:
+        """whether a URL has been added (never touches the disk, and takes no lock, see SeenSet)"""
+        return urlhash in self.seen
+
+    def __len__(self) -> int:
+        return len(self.seen)
+
+    def pending(self) -> list[str]:
+        """the URLs not downloaded yet"""
+        with self.lock:
+            return list(self.urls.values())
+
+    def _flush(self) -> None:
+        """writes and fsyncs the buffered records as one group (lock must be held)"""
+        if not self.buffer:
+            return
+        self.log.write("".join(self.buffer))
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        self.records += len(self.buffer)
+        self.buffer.clear()
+        self.buffered_at = None
+        if self.records >= COMPACTION_MIN_RECORDS and self.records > COMPACTION_RATIO * len(self.urls):
+            self._compact()
+
+    def _compact(self) -> None:
+        """saves the seen set and rewrites the log with just the URLs left to download (lock must be held)"""
+        self.seen.save(_seen_path(self.path)) # first, since the rewritten log no longer has the others
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for urlhash, url in self.urls.items():
+                f.write(f"{ADDED}\t{urlhash}\t{url}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.log.close()
+        os.replace(temp_path, self.path)
+        self.log = open(self.path, "a", encoding="utf-8")
+        self.records = len(self.urls)
+
+    def _flush_periodically(self) -> None:
+        """commits a group that's waited long enough, even if no more records come along to fill it"""
+        while not self.closed.wait(self.group_interval):
+            with self.lock:
+                if self.buffered_at is not None and time.time() - self.buffered_at >= self.group_interval:
+                    self._flush()
+
+    def sync(self) -> None:
+        """commits the buffered records now"""
+        with self.lock:
+            self._flush()
+
+    def close(self) -> None:
+        """commits what's buffered and compacts the log, so the next start loads quickly"""
+        self.closed.set()
+        with self.lock:
+            self._flush()
+            self._compact()
+            self.log.close()
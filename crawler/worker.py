@@ -4,7 +4,6 @@ from inspect import getsource
 from utils.download import download
 from utils import get_logger
 import scraper
-import time
 
 class Worker(Thread):
     def __init__(self, worker_id, config, frontier):
@@ -23,13 +22,17 @@ class Worker(Thread):
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            if resp:
-                self.logger.info(
-                    f"Downloaded {tbd_url}, status <{resp.status}>, "
-                    f"using cache {self.config.cache_server}.")
-                scraped_urls = scraper.scraper(tbd_url, resp, self.worker_id)
-                for scraped_url in scraped_urls:
-                    self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
+            try:
+                resp = download(tbd_url, self.config, self.logger)
+                if resp:
+                    self.logger.info(
+                        f"Downloaded {tbd_url}, status <{resp.status}>, "
+                        f"using cache {self.config.cache_server}.")
+                    scraped_urls = scraper.scraper(tbd_url, resp, self.worker_id)
+                    for scraped_url in scraped_urls:
+                        self.frontier.add_url(scraped_url)
+            except Exception as e:
+                self.logger.error(f"Failed to crawl {tbd_url}: {e!r}")
+            finally:
+                # releases the host (its politeness delay starts here), even if crawling the URL failed
+                self.frontier.mark_url_complete(tbd_url)
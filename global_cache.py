@@ -14,7 +14,7 @@ def shelve_globals():
         shelf["words_frequencies"] = s.words_frequencies
         shelf["seen_domains"] = s.seen_domains
         shelf["forbidden_crawls"] = s.forbidden_crawls
-        shelf["robots_data"] = s.robots_data
+        shelf["robots_cache"] = s.robots_cache
         shelf["ics_subdomains"] = s.ics_subdomains
         shelf["fingerprints"] = s.fingerprints
 
@@ -29,7 +29,7 @@ def unshelve_globals():
             s.words_frequencies = shelf["words_frequencies"]
             s.seen_domains = shelf["seen_domains"]
             s.forbidden_crawls = shelf["forbidden_crawls"]
-            s.robots_data = shelf["robots_data"]
+            s.robots_cache = shelf.get("robots_cache", s.robots_cache)
             s.ics_subdomains = shelf["ics_subdomains"]
             s.fingerprints = shelf["fingerprints"]
 
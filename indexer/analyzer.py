@@ -0,0 +1,93 @@
+"""Single-pass document analysis.
+
+A page is parsed once and its tree is walked once. That one walk collects
+everything the rest of the pipeline needs from the HTML: the page's text,
+which fields (title, bold, h1-h5) each part of that text is in, its outgoing
+hrefs and its title.
+"""
+from bisect import bisect_right
+from bs4 import BeautifulSoup as soup
+from bs4.element import Tag, NavigableString, CData
+from reader import FIELDS, TOKEN_PATTERN
+
+# tag -> the field mask its text is in
+FIELD_TAGS = {
+    'title': 1 << FIELDS.index('title'),
+    'strong': 1 << FIELDS.index('bold'), 'b': 1 << FIELDS.index('bold'), 'i': 1 << FIELDS.index('bold'),
+    'h1': 1 << FIELDS.index('h1'), 'h2': 1 << FIELDS.index('h2'), 'h3': 1 << FIELDS.index('h3'),
+    'h4': 1 << FIELDS.index('h4'), 'h5': 1 << FIELDS.index('h5'),
+}
+# the string types get_text() returns (i.e. not comments, scripts or stylesheets)
+TEXT_TYPES = (NavigableString, CData)
+
+
+class DocumentAnalysis:
+    """The result of analyzing one page.
+
+    Parameters:
+        text: the page's text, as soup.get_text() would return it
+        field_spans: (offset, field mask) pairs marking where in text the enclosing fields change
+        hrefs: the (non-empty) href of every <a> tag, in document order
+        title: the page's title (empty if it has none)
+    """
+    def __init__(self, text:str, field_spans:list[tuple[int, int]], hrefs:list[str], title:str):
+        self.text = text
+        self.field_spans = field_spans
+        self.hrefs = hrefs
+        self.title = title
+
+    def tokens(self) -> tuple[list[str], list[int]]:
+        """tokenizes the page's text, returning the tokens and the field mask of each one
+        (a token takes the fields of the text it starts in)"""
+        offsets = [offset for offset, _ in self.field_spans]
+        tokens = []
+        masks = []
+        for match in TOKEN_PATTERN.finditer(self.text):
+            tokens.append(match.group().lower())
+            span = bisect_right(offsets, match.start()) - 1
+            masks.append(self.field_spans[span][1] if span >= 0 else 0)
+        return tokens, masks
+
+    def __repr__(self):
+        return f"DocumentAnalysis(title={self.title!r}, hrefs={len(self.hrefs)}, text={len(self.text)} chars)"
+
+
+def analyze(html:str | bytes) -> DocumentAnalysis:
+    """parses a page with lxml and walks its tree exactly once"""
+    root = soup(html, features='lxml')
+    text = [] # every text string of the page
+    text_length = 0
+    field_spans = []
+    hrefs = []
+    title = []
+    title_done = False
+    open_masks = [0] # field masks of the elements enclosing the current node
+
+    # iterative pre-order walk; a None on the stack marks leaving a field element
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            open_masks.pop()
+        elif isinstance(node, Tag):
+            if node.name == 'a':
+                href = node.get('href')
+                if href:
+                    hrefs.append(href)
+            mask = FIELD_TAGS.get(node.name)
+            if mask is not None:
+                open_masks.append(open_masks[-1] | mask)
+                stack.append(None)
+            stack.extend(reversed(node.contents))
+        elif type(node) in TEXT_TYPES:
+            if not field_spans or field_spans[-1][1] != open_masks[-1]:
+                field_spans.append((text_length, open_masks[-1]))
+            if open_masks[-1] & FIELD_TAGS['title']:
+                if not title_done:
+                    title.append(node)
+            elif title: # text after the first title means it's over
+                title_done = True
+            text.append(node)
+            text_length += len(node)
+
+    return DocumentAnalysis("".join(text), field_spans, hrefs, " ".join("".join(title).split()))
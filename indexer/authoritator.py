@@ -1,114 +1,145 @@
+"""Builds the link graph of the corpus and scores pages on it.
+
+The graph is built in a single pass over the OMEGA_OUTGOING shelve: every page's hrefs
+are absolutized against its url, normalized, and looked up in one dict of
+normalized url -> docID. Links to pages outside the corpus, and links from a page to
+itself, are dropped. The graph is stored in link_graph.npz as a compact edge list
+(two int32 arrays of link sources and destinations) along with every page's in- and
+out-degree, which is all PageRank (see pagerank.py) and HITS need.
+
+HITS hub and authority scores are computed over that graph: a page's authority is the
+sum of the hub scores of the pages linking to it, and its hub score the sum of the
+authorities of the pages it links to. Both are found by (sparse) power iteration,
+normalized to sum to 1 every round.
+
+HITS can also be run at query time (query_authorities), over the subgraph around a query's
+top results, which ranks pages by authority on the query's topic rather than globally.
+That subgraph is capped at MAX_BASE_SET pages so it stays within a query's latency budget.
+"""
 import shelve
+import time
+from array import array
+import numpy as np
+from scipy.sparse import csr_matrix
 from reader import normalize, absolutize
-from time import sleep
+import ranker
+
+ID_TO_URL_FILE_NAME = "id-to-url.txt"
+OUTGOING_FILE_NAME = "OMEGA_OUTGOING"
+LINK_GRAPH_FILE_NAME = "link_graph.npz"
+HITS_TOLERANCE = 1e-8 # L1 distance between two iterations' scores at which they've converged
+HITS_MAX_ITERATIONS = 200
+QUERY_HITS_ITERATIONS = 20 # cap for query time HITS, which doesn't need full convergence
+MAX_INLINKS_PER_PAGE = 50 # pages linking to a result that are pulled into the base set
+MAX_BASE_SET = 2000
+
 
-def show_outgoing() -> None:
-    with shelve.open("OMEGA_OUTGOING_ABSONORM") as omega:
+def build_link_graph() -> None:
+    """streams OMEGA_OUTGOING once and writes the links between pages of the corpus to link_graph.npz"""
+    doc_urls = dict() # docID -> url
+    url_id = dict() # normalized url -> docID
+    with open(ID_TO_URL_FILE_NAME, "r") as f:
+        line = f.readline()
+        while line:
+            line = line.split()
+            doc_urls[int(line[0])] = line[1]
+            url_id[normalize(line[1])] = int(line[0])
+            line = f.readline()
+    page_count = max(doc_urls) + 1 if doc_urls else 0
+
+    sources = array('i')
+    destinations = array('i')
+    with shelve.open(OUTGOING_FILE_NAME, "r") as omega:
         for key in omega.keys():
-            print(f"{key}\n{omega[key]}\n")
-            sleep(2)
-
-def normalize_ID_URL() -> None:
-    with shelve.open("ID_URL") as urls:
-        with shelve.open("ID_URL_NORMAL") as normals:
-            for doc_id in urls.keys():
-                print(doc_id)
-                normals[doc_id] = normalize(urls[doc_id])
-
-def absolutize_outgoings() -> None:
-    with shelve.open("OMEGA_OUTGOING") as omega:
-        with shelve.open("OMEGA_OUTGOING_ABSONORM") as absonorm:
-            with shelve.open("ID_URL_NORMAL") as root_urls:
-                for doc_id in omega.keys():
-                    print(doc_id)
-                    links = omega[doc_id] # list of outgoing links in a document
-                    new_links = [normalize(absolutize(root_urls[doc_id], link)) for link in links]
-                    absonorm[doc_id] = new_links
-
-def httpsize_shelves() -> None:
-    with shelve.open("ID_URL_NORMAL") as normals:
-        with shelve.open("ID_URL_NORMAL_HTTPS") as https:
-            for doc_id in normals.keys():
-                print(doc_id)
-                https[doc_id] = normalize(normals[doc_id])
-    with shelve.open("OMEGA_OUTGOING_ABSONORM") as absonorm:
-        with shelve.open("OMEGA_OUTGOING_ABSONORM_HTTPS") as https:
-            for doc_id in absonorm.keys():
-                print(doc_id)
-                https[doc_id] = [normalize(url) for url in absonorm[doc_id]]
-                print(https[doc_id])
-
-def count_outgoings() -> None:
-    url_id = dict()
-    with shelve.open("ID_URL_NORMAL_HTTPS") as urls:
-        for doc_id in urls.keys():
-            url_id[urls[doc_id]] = doc_id
-            # print(f"{urls[doc_id]} mapped to {doc_id}")
-    corpus_urls = set()
-    with shelve.open("ID_URL_NORMAL_HTTPS") as urls:
-        for doc_id in urls.keys():
-            corpus_urls.add(urls[doc_id])
-    with shelve.open("OMEGA_OUTGOING_ABSONORM_HTTPS") as absonorm:
-        with shelve.open("ID_NUM_OUTGOINGS") as nums:
-            for doc_id in absonorm.keys():
-                count = 0
-                links = absonorm[doc_id]
-                for link in links:
-                    if link in corpus_urls:
-                        if doc_id != url_id[link]: count += 1
-                print(f"{doc_id} has {count} from {len(links)}")
-                nums[doc_id] = count
-
-def write_outgoing_counts() -> None:
-    with shelve.open("ID_NUM_OUTGOINGS") as nums:
-        with open("ID_NUM_OUTGOINGS.txt", "w") as text:
-            for doc_id in nums.keys():
-                text.write(f"{doc_id} {nums[doc_id]}\n")
-                print(f"{doc_id} {nums[doc_id]}")
-
-def list_incomings() -> None:
-    url_id = dict()
-    with shelve.open("ID_URL_NORMAL_HTTPS") as urls:
-        for doc_id in urls.keys():
-            url_id[urls[doc_id]] = doc_id
-            # print(f"{urls[doc_id]} mapped to {doc_id}")
-    with shelve.open("ID_INCOMING_LIST", writeback=True) as incomings:
-        with shelve.open("OMEGA_OUTGOING_ABSONORM_HTTPS") as omega:
-            for doc_id in omega.keys():
-                print(f"{doc_id}")
-                for link in omega[doc_id]:
-                    if link in url_id:
-                        if doc_id != url_id[link]:
-                            #print(f"{url_id[link]} aka {link} is in corpus!")
-                            if url_id[link] in incomings:
-                                incomings[url_id[link]].add(doc_id)
-                                #print(f"{url_id[link]} adds {doc_id}")
-                                #print(f"{url_id[link]} has {incomings[url_id[link]]}")
-                            else:
-                                incomings[url_id[link]] = {doc_id}
-                                #print(f"{url_id[link]} created with {doc_id}")
-
-def print_incomings() -> None:
-    with shelve.open("ID_INCOMING_LIST") as incomings:
-        for doc_id in incomings.keys():
-            if len(incomings[doc_id]) > 1:
-                print(f"{doc_id} referenced by {incomings[doc_id]}")
-
-def write_incomings() -> None:
-    with shelve.open("ID_INCOMING_LIST") as incomings:
-        with open("ID_INCOMING_LIST.txt", "w") as text:
-            for doc_id in incomings.keys():
-                text.write(f"{doc_id}|{[int(elem) for elem in list(incomings[doc_id])]}\n")
+            docID = int(key)
+            targets = set()
+            for link in omega[key]:
+                target = url_id.get(normalize(absolutize(doc_urls[docID], link)))
+                if target is not None and target != docID:
+                    targets.add(target)
+            for target in sorted(targets):
+                sources.append(docID)
+                destinations.append(target)
 
+    sources = np.frombuffer(sources, dtype=np.int32)
+    destinations = np.frombuffer(destinations, dtype=np.int32)
+    np.savez(LINK_GRAPH_FILE_NAME, sources=sources, destinations=destinations,
+             in_degrees=np.bincount(destinations, minlength=page_count).astype(np.int32),
+             out_degrees=np.bincount(sources, minlength=page_count).astype(np.int32))
+    print(f"Link graph: {page_count} pages, {len(sources)} links")
+
+
+def load_link_graph() -> tuple[np.ndarray, np.ndarray, int]:
+    """loads link_graph.npz. returns the link sources, the link destinations and the number of pages"""
+    with np.load(LINK_GRAPH_FILE_NAME) as graph:
+        return graph["sources"], graph["destinations"], len(graph["out_degrees"])
 
-if __name__ == '__main__':
-    #show_outgoing()
-    normalize_ID_URL()
-    absolutize_outgoings()
-    httpsize_shelves()
-    count_outgoings()
-    write_outgoing_counts()
-    list_incomings()
-    #print_incomings()
-    write_incomings()
 
+def link_matrices(sources:np.ndarray, destinations:np.ndarray, page_count:int) -> tuple[csr_matrix, csr_matrix]:
+    """returns the adjacency matrix of the link graph (A[i, j] = 1 if i links to j)
+    and its transpose, both in CSR form so a page's out- and in-links are a row slice"""
+    links = csr_matrix((np.ones(len(sources)), (sources, destinations)), shape=(page_count, page_count))
+    links.data[:] = 1 # duplicate links count once
+    return links, links.T.tocsr()
+
+
+def _hits(links:csr_matrix, backlinks:csr_matrix, tolerance:float, max_iterations:int) -> tuple[np.ndarray, np.ndarray, int]:
+    """power iteration of HITS; returns the authority scores, hub scores and the iterations it took"""
+    page_count = links.shape[0]
+    hubs = np.full(page_count, 1 / page_count)
+    authorities = np.full(page_count, 1 / page_count)
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        new_authorities = backlinks @ hubs
+        new_authorities /= new_authorities.sum() or 1
+        new_hubs = links @ new_authorities
+        new_hubs /= new_hubs.sum() or 1
+        change = np.abs(new_authorities - authorities).sum() + np.abs(new_hubs - hubs).sum()
+        authorities, hubs = new_authorities, new_hubs
+        if change < tolerance:
+            break
+    return authorities, hubs, iteration
+
+
+def compute_hits(sources:np.ndarray, destinations:np.ndarray, page_count:int,
+        tolerance:float=HITS_TOLERANCE, max_iterations:int=HITS_MAX_ITERATIONS) -> tuple[np.ndarray, np.ndarray]:
+    """computes the global authority and hub score of every docID"""
+    if not page_count:
+        return np.zeros(0), np.zeros(0)
+    authorities, hubs, iterations = _hits(*link_matrices(sources, destinations, page_count), tolerance, max_iterations)
+    print(f"HITS converged after {iterations} iterations")
+    return authorities, hubs
+
+
+def query_authorities(results:list[int], links:csr_matrix, backlinks:csr_matrix,
+        max_base_set:int=MAX_BASE_SET, iterations:int=QUERY_HITS_ITERATIONS) -> dict[int, float]:
+    """
+    Query time HITS: expands a query's top results (the root set) with the pages they link to
+    and up to MAX_INLINKS_PER_PAGE of the pages linking to each, stopping at max_base_set pages,
+    then runs HITS on the subgraph between them.
+    returns docID:authority for every page of the root set
+    """
+    results = [docID for docID in results if docID < links.shape[0]]
+    if not results:
+        return {}
+    base_set = dict.fromkeys(results) # keeps insertion order, so the root set always makes the cut
+    for docID in results:
+        if len(base_set) >= max_base_set:
+            break
+        base_set.update(dict.fromkeys(links.indices[links.indptr[docID]:links.indptr[docID + 1]].tolist()))
+        inlinks = backlinks.indices[backlinks.indptr[docID]:backlinks.indptr[docID + 1]]
+        base_set.update(dict.fromkeys(inlinks[:MAX_INLINKS_PER_PAGE].tolist()))
+    pages = np.fromiter(base_set, dtype=np.int64)[:max_base_set]
+    subgraph = links[pages][:, pages]
+    authorities, _, _ = _hits(subgraph, subgraph.T.tocsr(), HITS_TOLERANCE, iterations)
+    return dict(zip(results, authorities[:len(results)].tolist()))
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+    build_link_graph()
+    print("--- link graph: %s seconds ---" % (time.time() - start_time))
+    start_time = time.time()
+    authorities, _ = compute_hits(*load_link_graph())
+    ranker.write_authorities(authorities)
+    print("--- HITS: %s seconds ---" % (time.time() - start_time))
@@ -1,203 +1,220 @@
 """For A3 M3."""
-import shelve
 import reader
-import json 
 import time
-import math
 import ranker
-import heapq
-from nltk.stem import PorterStemmer as PS
+import os
+import re
+import authoritator
+import filterer
+from cache import LRUCache
+from postings import IndexReader, INDEX_FILE_NAME, LEXICON_FILE_NAME, WEIGHTS_FILE_NAME, CHAMPIONS_FILE_NAME
+from stemmer import CachedStemmer, STEM_CACHE_FILE_NAME
 
 ID_TO_URL = dict()
-ID_WORDCOUNT = dict()
 K = 50
-A = 300
-ALPHA = 1.5 # tuning factor for computing relevance scores
-BETA = 2.5 # tuning factor for computing relevance scores
+QUERY_HITS = False # re-rank the top K results by their HITS authority around the query (see authoritator.query_authorities)
+DELTA = 2.5 # tuning factor for the query time authority
+EPSILON = 0.5 # tuning factor for how close together the query's terms are in a page
+PHRASE_PATTERN = re.compile(r'"([^"]*)"') # a quoted phrase in a query
+RESULT_CACHE_SIZE = 10_000 # queries whose results are kept
+POSTINGS_CACHE_SIZE = 256 # terms whose decoded docID blocks are kept
+# everything a query's results depend on; once any of them changes, the engine reloads
+GENERATION_FILES = [INDEX_FILE_NAME, LEXICON_FILE_NAME, WEIGHTS_FILE_NAME, CHAMPIONS_FILE_NAME,
+                    ranker.DOC_NORMS_FILE_NAME, ranker.PAGERANK_FILE_NAME, ranker.AUTHORITY_FILE_NAME, "id-to-url.txt"]
 # constants for how many results we return
 
 
-def doc_intersection(list1:int, list2:int) -> list:
-    """Computes the intersection of two lists
-    of document IDs
-    """
-    res = [] # init empty list
-    while list1 and list2: # iterate through both lists, building res if an element is shared between them
-        if list1[-1] == list2[-1]:
-            res.append(list1.pop())
-            list2.pop()
-        elif list1[-1] < list2[-1]:
-            list1.pop()
-        else:
-            list2.pop()
-    return res # return the list of shared elements
-
-
-def _extract_index_of_index() -> dict[str:int]:
-    """extracts the index of the index into a dictionary,
-    a mapping between token:byte"""
-    res = {}
-    with open("index_of_index.txt", "r") as f:
-        line = f.readline()
-        while line:
-            splitline = line.split("|")
-            res[splitline[0].strip()] = int(splitline[1])
-            line = f.readline()
-    return res
-
-
-def _term_idfs(index_file_seek:dict[str:int]) -> dict[str:int]:
-    """pre-computes the idf for all terms in the index"""
-    res = {}
-    with open("index.txt", "r") as f:
-        for term in index_file_seek:
-            f.seek(index_file_seek[term])
-            line = f.readline()
-            line = line.split(" | ")
-            res[term] = math.log(55393 / len([i for i in line[1:] if i and i != '\n']))
-    return res
+def index_generation() -> tuple:
+    """the size and modification time of every file in GENERATION_FILES (None for a missing one)"""
+    generation = []
+    for path in GENERATION_FILES:
+        try:
+            stat = os.stat(path)
+            generation.append((stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            generation.append(None)
+    return tuple(generation)
 
 
-def _extract_postings_list(term:str, index_of_index:dict) -> list[int]:
-    """retrieves the postings list for a given term
-    result returned in the form [docID]
-    """
-    postings = list()
-    with open("index.txt", "r") as f:
-        f.seek(index_of_index[term])
-        line = f.readline()
-        line = line.split(" | ")
-        for posting in line[1:]:
-            if posting and posting != '\n':
-                posting = posting.split("|")
-                postings.append(int(posting[0]))
-    return postings 
-
-
-def _load_id_to_url():
+def _load_id_to_url() -> dict[int, str]:
     """loads data from id_to_url.txt
-    into a in-memory variable"""
+    into a in-memory variable (returned, for the caller to swap into ID_TO_URL)"""
+    id_to_url = dict()
     with open("boolean-log.txt", "a") as log:
         log.write(f"loading id urls\n")
     with open('id-to-url.txt', 'r') as f:
         line = f.readline()
         while line:
             line = line.split()
-            ID_TO_URL[int(line[0])] = line[1].strip()
+            id_to_url[int(line[0])] = line[1].strip()
             line = f.readline()
     with open("boolean-log.txt", "a") as log:
         log.write(f"completed loading id urls\n")
+    return id_to_url
 
 
-def _compute_tf_idfs(index_of_index:dict, id_wordcount:dict) -> None:
-    """pre-computes all tf-idf scores for 
-    every term against every doc in its postings list"""
-    with open("boolean-log.txt", "a") as log:
-        log.write(f"computing tf idf scores\n")
-    with open('tf-idf.txt', 'a') as f:
-        for term in index_of_index:
-            for docID in _extract_postings_list(term, index_of_index):
-                with open("boolean-log.txt", "a") as log:
-                    log.write(f"{term}|{docID}\n")
-                f.write(f"{term}|{docID}|{ranker.compute_tf_idf(term, docID, index_of_index, id_wordcount)}\n") 
-    with open("boolean-log.txt", "a") as log:
-        log.write(f"all scores computed!\n")
-
-
-def _retrieve_tf_idf() -> dict[(str, int):float]:
-    scores = dict()
-    with open('tf-idf.txt', 'r') as f:
-        line = f.readline()
-        while line:
-            line = line.split("|")
-            scores[(line[0], int(line[1]))] = float(line[2])
-            line = f.readline()
-    return scores
-
+class SearchEngine:
+    """
+    Everything a query needs (the index, urls, static scores...), loaded once.
+    Used by the interactive engine below and by the query server (see server.py)
+
+    The results of recent queries are cached, keyed on their stemmed terms (so "Learning machine"
+    hits the entry of "machine learn"). Every query checks the index generation first; once the
+    index or a static score has been rebuilt, everything is reloaded and the caches start over.
+    If the new files can't be loaded (say they're halfway through being rebuilt), the engine
+    keeps serving the generation it has until they change again.
+    """
+    def __init__(self):
+        self.stemmer = CachedStemmer()
+        self.stemmer.load(STEM_CACHE_FILE_NAME)
+        self.results = LRUCache(RESULT_CACHE_SIZE)
+        self.queries = 0
+        self.index = None
+        self.failed_generation = None # the last generation that couldn't be loaded
+        self.load()
+
+    def load(self) -> None:
+        """(re)loads the index and everything computed from it.
+        all of it is loaded before any of it replaces what's being served,
+        so if loading fails, the engine is left as it was"""
+        generation = index_generation()
+        index = IndexReader(postings_cache_size=POSTINGS_CACHE_SIZE)
+        try:
+            id_to_url = _load_id_to_url()
+            page_ranks = ranker.load_pagerank()
+            authorities = ranker.load_authorities()
+            links = backlinks = None
+            if QUERY_HITS:
+                links, backlinks = authoritator.link_matrices(*authoritator.load_link_graph())
+            doc_norms = ranker.load_doc_norms()
+            # the query independent part of every document's relevance score
+            static_scores = ranker.static_scores(page_ranks, authorities)
+        except BaseException:
+            index.close()
+            raise
+        old_index = self.index
+        self.index = index
+        ID_TO_URL.clear()
+        ID_TO_URL.update(id_to_url)
+        self.links, self.backlinks = links, backlinks
+        self.doc_norms = doc_norms
+        self.static_scores = static_scores
+        self.static_bound = max(static_scores, default=0) # what no static score exceeds, for WAND's bounds
+        self.generation = generation
+        self.results.clear()
+        if old_index is not None:
+            old_index.close()
+
+    def parse(self, query:str) -> tuple[list[str], bool, list[list[tuple[str, int]]]]:
+        """turns a query into its (stemmed, indexed) terms, whether it's an AND query, and its phrases"""
+        terms = PHRASE_PATTERN.sub(" ", query).strip().split() # tokenize by space the query (outside of phrases)
+        conjunctive = "AND" in terms # "a AND b" only matches documents with both
+        terms = [self.stemmer.stem(term.lower()) for term in terms if term != "AND"] # lowercase the query
+        phrases = [] # '"a b"' only matches documents with a right before b
+        unmatched = False # a phrase has a term no document has
+        for phrase_text in PHRASE_PATTERN.findall(query):
+            # terms the indexer leaves out on purpose are left out, but still take up their place in the phrase
+            phrase = [(self.stemmer.stem(token), offset) for offset, token in enumerate(reader.tokenize_text(phrase_text))]
+            phrase = [(term, offset) for term, offset in phrase if not filterer.evaluate_token(term)]
+            unmatched = unmatched or any(term not in self.index for term, _ in phrase)
+            if phrase:
+                phrases.append(phrase)
+                terms.extend(term for term, _ in phrase)
+        query_terms = [term for term in terms if term in self.index]
+        if unmatched or (conjunctive and len(query_terms) < len(terms)): # a term no document has
+            return [], conjunctive, []
+        return query_terms, conjunctive, phrases
+
+    def search(self, query:str, k:int=K, verbose:bool=False) -> dict:
+        """
+        Answers a query. returns a dict with the query, its top k results
+        (each a dict of url, docID and score) and how long it took, in ms
+        """
+        start_time = time.time()
+        self.queries += 1
+        generation = index_generation()
+        if generation != self.generation and generation != self.failed_generation:
+            print("the index has changed, reloading")
+            try:
+                self.load()
+            except Exception as e:
+                self.failed_generation = generation
+                print(f"couldn't load the new index ({e!r}), still serving the previous one")
+        query_terms, conjunctive, phrases = self.parse(query)
+        key = (tuple(sorted(query_terms)), conjunctive, tuple(tuple(phrase) for phrase in phrases), k)
+        top = self.results.get(key)
+        if top is None:
+            top = self.rank(query_terms, conjunctive, phrases, k, verbose)
+            self.results.put(key, top)
+        elif verbose:
+            print("results from the result cache")
+        return {
+            "query": query,
+            "results": [{"url": ID_TO_URL.get(docID), "doc_id": docID, "score": score} for score, docID in top],
+            "runtime_ms": (time.time() - start_time) * 1000,
+        }
+
+    def rank(self, query_terms:list[str], conjunctive:bool, phrases:list[list[tuple[str, int]]], k:int,
+             verbose:bool=False) -> tuple[tuple[float, int], ...]:
+        """scores a parsed query, returning its top k (score, docID) pairs"""
+        start_time = time.time()
+        idfs = {term: self.index.idf(term) for term in query_terms} # stored in the lexicon
+        if verbose:
+            for term in query_terms:
+                print(f"term {term}'s idf: {idfs[term]}")
+        query_vector = ranker.query_weights(query_terms, idfs)
+        candidates = 2 * k # results re-ranked by the proximity of the query's terms
+        # g(d) + cosine_sim(q, d), with tuning factors.
+        # the champion lists keep common terms cheap; the full lists are only needed if they come up short
+        if conjunctive or phrases:
+            required = None if conjunctive else [] # a phrase's terms are required either way
+            top = ranker.conjunctive_top_k(query_vector, self.index, self.doc_norms, candidates, self.static_scores,
+                                           ranker.BETA, required, phrases)
+        else:
+            top = ranker.wand_top_k(query_vector, self.index, self.doc_norms, candidates, self.static_scores,
+                                    ranker.BETA, champions=True, static_bound=self.static_bound)
+            if len(top) < k:
+                if verbose:
+                    print("not enough results from the champion lists, using the full postings lists")
+                top = ranker.wand_top_k(query_vector, self.index, self.doc_norms, candidates, self.static_scores,
+                                        ranker.BETA, static_bound=self.static_bound)
+        top = ranker.proximity_rerank(top, query_terms, self.index, EPSILON)[:k]
+        if verbose:
+            print(f"time to compute top {k}: {(time.time() - start_time) * 1000}ms")
+            for res in top:
+                print(res)
+        if QUERY_HITS:
+            s = time.time()
+            query_authority = authoritator.query_authorities([docID for _, docID in top], self.links, self.backlinks)
+            top = sorted(((score + DELTA * query_authority.get(docID, 0), docID) for score, docID in top), reverse=True)
+            if verbose:
+                print(f"time to compute query authorities: {(time.time() - s) * 1000}ms")
+        return tuple(top)
 
-def _get_doc_wordcount() -> dict[int:int]:
-    """gets wordcount of each page.
-    dict returned is docID:wordcount"""
-    with open("boolean-log.txt", "a") as log:
-        log.write(f"getting wordcounts\n")
-    res = dict()
-    with open("ID_WORDCOUNT.txt", "r") as f:
-        line = f.readline()
-        while line:
-            line = line.split()
-            res[int(line[0])] = int(line[1])
-            line = f.readline()
-    with open("boolean-log.txt", "a") as log:
-        log.write(f"completd getting wordcounts\n")
-    return res
+    def stats(self) -> dict:
+        return {"terms": len(self.index), "documents": len(ID_TO_URL), "queries": self.queries,
+                "stem_cache": self.stemmer.stats(), "result_cache": self.results.stats(),
+                "postings_cache": self.index.postings_cache.stats()}
 
 
 def run_engine() -> None:
     """
     Engine for boolean retrieval
     """
-    index_of_index = _extract_index_of_index()
-    idfs = _term_idfs(index_of_index)
-    _load_id_to_url()
-    id_wordcount = _get_doc_wordcount()
-    #_compute_tf_idfs(index_of_index, id_wordcount) # not needed once all scores computed 
-    tf_idf_scores = _retrieve_tf_idf()
-    page_ranks = ranker.compute_pagerank(index_of_index)
-    stemmer = PS()
+    engine = SearchEngine()
     while True: # infinite loop for input
         query = input("Enter query: ") # prompt input
-        start_time = time.time()
-        terms = query.lower().strip().split() # lowercase and tokenize by space the query
-        terms = [stemmer.stem(term) for term in terms]
-        val_terms = [term for term in terms if term in index_of_index]
-        for term in val_terms:
-            print(f"term {term}'s idf: {idfs[term]}")
-            # todo: heuristic for high IDFs
-        rel_scores = dict()
-        low_idf_scores = sum(1 for term in val_terms if idfs[term] < 1)
-        for term in set(val_terms):
-            if idfs[term] < 1 and low_idf_scores / len(val_terms)  < 0.6:
-                print("skipping ", term)
-                continue # ignore low idf terms if they make up less than 60% of the query
-            # todo: ignore docs with a 0 cosine sim
-            s = time.time()
-            term_postings = _extract_postings_list(term, index_of_index)
-            e = time.time()
-            print(f"time to extract postings: {(e - s) * 1000}ms")
-            s = time.time()
-            blacklist = set()
-            for docID in term_postings:
-                if len(rel_scores) == A:
-                    break
-                if docID not in rel_scores and docID not in blacklist:
-                    result = ALPHA * page_ranks[docID] + BETA * ranker.compute_cosine_sim(val_terms, docID, idfs, index_of_index, tf_idf_scores)
-                    # g(d) + cosine_sim(q, d), with tuning factors
-                    if result:
-                        rel_scores[docID] = result
-                    else:
-                        blacklist.add(docID)
-            e = time.time()
-            print(f"time to compute cosine score: {(e - s) * 1000}ms")
-        s = time.time()
-        score_heap = [(-score, docID) for docID, score in rel_scores.items() if score != 0]
-        heapq.heapify(score_heap)
-        e = time.time()
-        print(f"time to get heap: {(e - s) * 1000}ms")
-        results = [] # list of urls
-        for _ in range(min(len(score_heap), K)):
-            res = heapq.heappop(score_heap)
-            print(res)
-            results.append(ID_TO_URL[res[1]]) # shelve maps str(doc_id) to doc_url!
+        response = engine.search(query, verbose=True)
         #with open('log.txt', 'w') as f: # log results
             #f.write(f"---- Results for '{query}':\n")
         print(f"---- Results for '{query}':")
-        for url in results: # print out all results
+        for result in response["results"]: # print out all results
             #with open('log.txt', 'a') as f:
                 #f.write(f"{url}\n")
-            print(url)
-        end_time = time.time()
-        runtime_ms = (end_time - start_time) * 1000
-        print("Runtime: {} milliseconds".format(runtime_ms))
+            print(result["url"])
+        print("Runtime: {} milliseconds".format(response["runtime_ms"]))
+        print(f"Stem cache: {engine.stemmer.stats()}")
+        print(f"Result cache: {engine.results.stats()}")
 
 if __name__ == '__main__':
-    run_engine()
\ No newline at end of file
+    run_engine()
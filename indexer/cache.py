@@ -0,0 +1,54 @@
+"""Small in-memory caches shared by the indexer and the search engine."""
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A bounded mapping that evicts its least recently used entry once it holds maxsize entries.
+    Keeps hit/miss counts so callers can report how well the cache is doing."""
+    def __init__(self, maxsize:int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """returns the value cached for key (marking it as recently used), or default on a miss"""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        """caches value under key, evicting the least recently used entry if the cache is full"""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def items(self):
+        """(key, value) pairs from least to most recently used"""
+        return self.entries.items()
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        """hit/miss counts, hit rate and current size of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
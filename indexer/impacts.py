@@ -0,0 +1,238 @@
+"""Computes the tf-idf weight ("impact") of every posting in the index, and every document's norm.
+
+This runs as its own stage after the index has been merged, so the weights can be
+recomputed (e.g. after retuning ranker.FIELD_WEIGHTS) without reindexing.
+
+The lexicon is split into contiguous term ranges holding about the same number of
+postings, and each range is handled by its own process. A worker streams its range
+of the postings file once, computes all of a term's weights from its decoded postings,
+and writes them straight into the term's slot of weights.bin (which the IndexWriter
+preallocated). Since the ranges are contiguous, so are the slots, so every worker
+writes its part of weights.bin sequentially.
+
+Once every document's norm is known, a second (much cheaper) round goes over the docIDs
+and weights of each range again to find every term's max impact, the largest
+weight / document norm of its postings, and writes it into the term's lexicon record
+in place. That's the bound the engine's dynamic pruning relies on (see ranker.wand_top_k).
+The same round picks the champion list of every term with more than CHAMPION_SIZE postings:
+the CHAMPION_SIZE postings whose documents the engine would rank highest for the term alone,
+by BETA * impact + ALPHA * PageRank + GAMMA * authority (see ranker.static_scores; the static
+scores count as 0 until pagerank.bin and authority.bin have been computed, and pagerank.py
+refreshes the champion lists once they have), written to champions.bin.
+
+Every CHECKPOINT_INTERVAL postings, a worker flushes its weights and saves a checkpoint:
+the next term it has to do, and the squared norms it has summed so far. An interrupted
+run picks up from the checkpoints instead of starting over. Checkpoints only get reused
+if MANIFEST matches the current index and field weights; otherwise they're thrown away.
+"""
+import heapq
+import json
+import math
+import os
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from shutil import rmtree as rmdir
+import ranker
+from postings import (IndexReader, decode_postings, decode_doc_ids, write_champions, INDEX_FILE_NAME,
+                      LEXICON_FILE_NAME, WEIGHTS_FILE_NAME, CHAMPIONS_FILE_NAME, WEIGHT_SIZE, LEXICON_HEADER,
+                      LEXICON_RECORD, MAX_IMPACT_OFFSET, CHAMPION_SIZE)
+
+IMPACTS_PATH = "impacts"
+MANIFEST_FILE_NAME = f"{IMPACTS_PATH}/MANIFEST"
+WORDCOUNT_FILE_NAME = "ID_WORDCOUNT.txt"
+CHECKPOINT_INTERVAL = 1_000_000 # number of postings weighted between checkpoints
+CHECKPOINT_HEADER = struct.Struct("<I") # next term to weight
+MAX_IMPACT = struct.Struct("<f")
+# max impacts are stored as float32s (as are the weights they're computed from), so they're
+# rounded up by this much to stay upper bounds of the weight / norm the engine computes in doubles
+IMPACT_SLACK = 1 + 1e-6
+
+
+def _checkpoint_path(shard:int) -> str:
+    return f"{IMPACTS_PATH}/shard-{shard:03}.ckpt"
+
+
+def load_wordcounts() -> dict[int, int]:
+    """loads ID_WORDCOUNT.txt. dict returned is docID:wordcount"""
+    res = dict()
+    with open(WORDCOUNT_FILE_NAME, "r") as f:
+        line = f.readline()
+        while line:
+            line = line.split()
+            res[int(line[0])] = int(line[1])
+            line = f.readline()
+    return res
+
+
+def shard_terms(index:IndexReader, shard_count:int) -> list[tuple[int, int]]:
+    """splits the lexicon into at most shard_count contiguous (start, stop) term ranges,
+    each holding about the same number of postings"""
+    total = index.posting_count()
+    bounds = [0]
+    for shard in range(1, shard_count):
+        target = total * shard // shard_count
+        low, high = bounds[-1], len(index) # first term whose postings start at or after target
+        while low < high:
+            mid = (low + high) // 2
+            if index.ordinal(mid) < target:
+                low = mid + 1
+            else:
+                high = mid
+        bounds.append(low)
+    bounds.append(len(index))
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if start < stop]
+
+
+def _manifest(shards:list[tuple[int, int]]) -> dict:
+    """what a set of checkpoints was computed against"""
+    stat = os.stat(INDEX_FILE_NAME) # not the lexicon, which the max impacts get written into
+    return {"index": [stat.st_size, stat.st_mtime_ns], "field_weights": ranker.FIELD_WEIGHTS,
+            "shards": [list(shard) for shard in shards]}
+
+
+def _load_checkpoint(shard:int, start:int, doc_slots:int) -> tuple[int, array]:
+    """returns the next term a shard has to weight and its squared norms so far"""
+    squared_norms = array('d')
+    try:
+        with open(_checkpoint_path(shard), "rb") as f:
+            (next_term,) = CHECKPOINT_HEADER.unpack(f.read(CHECKPOINT_HEADER.size))
+            squared_norms.frombytes(f.read())
+    except FileNotFoundError:
+        return start, array('d', bytes(8 * doc_slots))
+    return next_term, squared_norms
+
+
+def _save_checkpoint(shard:int, next_term:int, squared_norms:array) -> None:
+    """atomically replaces a shard's checkpoint, so a crash mid-write leaves the previous one"""
+    temp_path = _checkpoint_path(shard) + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(CHECKPOINT_HEADER.pack(next_term))
+        squared_norms.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, _checkpoint_path(shard))
+
+
+def weight_shard(shard:int, start:int, stop:int, id_wordcount:dict[int, int], doc_slots:int) -> array:
+    """
+    Weights the terms start..stop-1, resuming from the shard's checkpoint if there is one.
+    Returns the squared norms the shard contributes to each document
+    """
+    next_term, squared_norms = _load_checkpoint(shard, start, doc_slots)
+    if next_term < stop:
+        print(f"Impacts shard {shard} running from term {next_term} (terms {start}-{stop})")
+    with IndexReader() as index, open(WEIGHTS_FILE_NAME, "r+b") as weights_file:
+        weights_file.seek(index.ordinal(next_term) * WEIGHT_SIZE)
+        since_checkpoint = 0
+        for term_number, (term, record, buf) in enumerate(index.scan(next_term, stop), next_term):
+            weights = array('f')
+            for posting in decode_postings(buf):
+                weight = ranker.compute_weight(ranker.weighted_tf(posting), id_wordcount[posting.document_id],
+                                               record.idf)
+                weights.append(weight)
+                squared_norms[posting.document_id] += weight ** 2
+            weights.tofile(weights_file)
+            since_checkpoint += record.df
+            if since_checkpoint >= CHECKPOINT_INTERVAL or term_number + 1 == stop:
+                weights_file.flush()
+                os.fsync(weights_file.fileno())
+                _save_checkpoint(shard, term_number + 1, squared_norms)
+                since_checkpoint = 0
+    return squared_norms
+
+
+def bound_shard(start:int, stop:int, doc_norms, static_scores) -> tuple[array, array, array]:
+    """writes the max impact of the terms start..stop-1 into their lexicon records,
+    and picks their champion lists. returns the number of champions of each term
+    (0 if it's short enough not to need any) and all of their docIDs and weights"""
+    counts, champion_ids, champion_weights = array('I'), array('I'), array('f')
+    with IndexReader() as index, open(LEXICON_FILE_NAME, "r+b") as lexicon:
+        for term_number, (term, record, buf) in enumerate(index.scan(start, stop), start):
+            max_impact = 0.0
+            doc_ids = decode_doc_ids(buf)
+            weights = index.entry_weights(record)
+            impacts = []
+            for docID, weight in zip(doc_ids, weights):
+                impact = weight / doc_norms[docID] if doc_norms[docID] else 0.0
+                impacts.append(impact)
+                if impact > max_impact:
+                    max_impact = impact
+            lexicon.seek(LEXICON_HEADER.size + term_number * LEXICON_RECORD.size + MAX_IMPACT_OFFSET)
+            lexicon.write(MAX_IMPACT.pack(max_impact * IMPACT_SLACK))
+            if record.df <= CHAMPION_SIZE:
+                counts.append(0)
+                continue
+            # scored the way ranker.wand_top_k scores a document for a one term query
+            champions = sorted(heapq.nlargest(CHAMPION_SIZE, range(record.df),
+                key=lambda i: ranker.BETA * impacts[i] + (static_scores[doc_ids[i]] if doc_ids[i] < len(static_scores) else 0)))
+            counts.append(len(champions))
+            champion_ids.extend(doc_ids[i] for i in champions)
+            champion_weights.extend(weights[i] for i in champions)
+    return counts, champion_ids, champion_weights
+
+
+def write_bounds(pool:ProcessPoolExecutor, shards:list[tuple[int, int]], doc_norms) -> None:
+    """fills in the lexicon's max impacts and writes champions.bin, one task per shard"""
+    page_ranks = ranker.load_pagerank() if os.path.exists(ranker.PAGERANK_FILE_NAME) else []
+    authorities = ranker.load_authorities() if os.path.exists(ranker.AUTHORITY_FILE_NAME) else []
+    static_scores = ranker.static_scores(page_ranks, authorities)
+    counts, champion_ids, champion_weights = array('I'), array('I'), array('f')
+    for future in [pool.submit(bound_shard, start, stop, doc_norms, static_scores) for start, stop in shards]:
+        shard_counts, shard_ids, shard_weights = future.result()
+        counts.extend(shard_counts)
+        champion_ids.extend(shard_ids)
+        champion_weights.extend(shard_weights)
+    write_champions(CHAMPIONS_FILE_NAME, counts, champion_ids, champion_weights)
+
+
+def refresh_champions(shard_count:int | None=None) -> None:
+    """re-picks the champion lists of the current index (e.g. once PageRank or the authorities have been recomputed)"""
+    with IndexReader() as index:
+        shards = shard_terms(index, shard_count or os.cpu_count() or 1)
+    doc_norms = ranker.load_doc_norms()
+    with ProcessPoolExecutor(max_workers=max(len(shards), 1)) as pool:
+        write_bounds(pool, shards, doc_norms)
+
+
+def compute_impacts(id_wordcount:dict[int, int] | None=None, shard_count:int | None=None) -> None:
+    """
+    Fills in weights.bin, writes doc_norms.bin, fills in the lexicon's max impacts and writes
+    champions.bin for the current index with a pool of (by default) one process per core, resuming an interrupted run if there is one
+    """
+    if id_wordcount is None:
+        id_wordcount = load_wordcounts()
+    with IndexReader() as index:
+        shards = shard_terms(index, shard_count or os.cpu_count() or 1)
+    manifest = _manifest(shards)
+    try:
+        with open(MANIFEST_FILE_NAME, "r") as f:
+            resumable = json.load(f) == manifest
+    except (FileNotFoundError, json.JSONDecodeError):
+        resumable = False
+    if not resumable: # checkpoints of another index (or of other field weights) are no use
+        if os.path.exists(IMPACTS_PATH): rmdir(IMPACTS_PATH)
+        os.makedirs(IMPACTS_PATH)
+        with open(MANIFEST_FILE_NAME, "w") as f:
+            json.dump(manifest, f)
+
+    doc_slots = max(id_wordcount) + 1 if id_wordcount else 0
+    with ProcessPoolExecutor(max_workers=max(len(shards), 1)) as pool:
+        futures = [pool.submit(weight_shard, shard, start, stop, id_wordcount, doc_slots)
+                   for shard, (start, stop) in enumerate(shards)]
+        squared_norms = [0.0] * doc_slots
+        for future in futures:
+            for docID, norm in enumerate(future.result()):
+                squared_norms[docID] += norm
+        doc_norms = [math.sqrt(norm) for norm in squared_norms]
+        ranker.write_doc_norms(doc_norms)
+        write_bounds(pool, shards, doc_norms)
+    rmdir(IMPACTS_PATH) # done; a rerun starts from scratch
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+    compute_impacts(shard_count=int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print("--- %s seconds ---" % (time.time() - start_time))
@@ -1,203 +1,259 @@
-import shelve
 import json
 import reader as reader
+from postings import write_run, read_run, decode_df, IndexWriter
+import filterer
+import impacts
+import ranker
+import heapq
 import os
+import shelve
+import shutil
 from shutil import rmtree as rmdir
-from bs4 import BeautifulSoup as soup
-import threading
+import analyzer
 import time
-from nltk.stem import PorterStemmer as PS
+from concurrent.futures import ProcessPoolExecutor
+from stemmer import CachedStemmer, STEM_CACHE_FILE_NAME
 
 """Contains the source code for the Inverted Index"""
 
 DEV_PATH = f"./DEV/"
 TINYDEV_PATH = f"./TINYDEV/"
-TEMP_FILE_NAME = f"content"
-INVERTED_INDEX_FILE_NAME = f"OMEGA_INDEX"
-OUTGOING_LINKS_SAVE_NAME = f"OUTGOING_LINKS"
+RUNS_PATH = f"runs"
+WORDCOUNT_FILE_NAME = f"ID_WORDCOUNT.txt"
+OUTGOING_FILE_NAME = f"OMEGA_OUTGOING"
+TITLES_FILE_NAME = f"id-to-title.txt"
+MEMORY_LIMIT = 5_000_000 # number of postings + positions held in memory before a run is flushed
 
 """
-Note to TA: shelve is meets the memory/disk constraints of A3
-Clotho AI:
-No, opening a shelf using the `shelve` module in Python does not load its entire contents into memory.
-Instead, it allows you to access the data on an as-needed basis, similar to a dictionary.
-When you access a particular key in the shelf, the corresponding data is read from the disk.
-This makes `shelve` suitable for working with large datasets because it doesn't require that all data be loaded into memory at once.
+The index is built SPIMI style (single-pass in-memory indexing): each worker keeps
+a plain dict of term -> postings and, whenever it holds more than MEMORY_LIMIT
+postings + positions, writes the dict out as a term-sorted run file and starts over.
+Once every worker is done, merge_runs streams all of the runs at once
+(a k-way heap merge) and writes the final binary index in one sequential pass.
+Memory stays bounded by MEMORY_LIMIT per worker no matter how large DEV/ grows.
+
+Workers are separate processes (see run_indexing), one per core, so parsing,
+tokenizing and stemming actually run in parallel. Each one gets a contiguous
+shard of the docIDs in id_to_file.txt, balanced by the byte size of the files.
+
+Every page is parsed and walked exactly once (see analyzer.py); the word counts
+(ID_WORDCOUNT.txt), outgoing links (OMEGA_OUTGOING) and titles (id-to-title.txt)
+are produced from that same walk rather than by separate passes over DEV/.
 """
 ID_TO_FILE = dict()
 
-def generate_inverted_index(start:int, end:int, tid:int) -> None:
+def _run_path(tid:int, run_number:int) -> str:
+    return f"{RUNS_PATH}/run-{tid:03}-{run_number:04}.bin"
+
+
+def load_id_to_file() -> None:
+    """loads id_to_file.txt into ID_TO_FILE"""
+    with open("id_to_file.txt", "r") as f:
+        line = f.readline().strip()
+        while line:
+            docID, url = int(line.split()[0]), line.split()[1]
+            ID_TO_FILE[docID] = url
+            line = f.readline().strip()
+
+
+def shard_documents(shard_count:int) -> list[list[tuple[int, str]]]:
+    """
+    Splits the documents in ID_TO_FILE into at most shard_count contiguous
+    runs of docIDs, each holding about the same number of bytes on disk
+    (page sizes vary far too much for doc counts to balance the work)
+    """
+    documents = sorted(ID_TO_FILE.items())
+    sizes = [os.path.getsize(filepath) for _, filepath in documents]
+    target = sum(sizes) / shard_count
+    shards = [[]]
+    shard_size = 0
+    for document, size in zip(documents, sizes):
+        if shard_size >= target > 0 and len(shards) < shard_count: # empty files alone would otherwise get a shard each
+            shards.append([])
+            shard_size = 0
+        shards[-1].append(document)
+        shard_size += size
+    return [shard for shard in shards if shard]
+
+
+def _stem_cache_path(tid:int) -> str:
+    return f"{RUNS_PATH}/stems-{tid:03}.txt"
+
+
+def _side_output_path(name:str, tid:int) -> str:
+    return f"{RUNS_PATH}/{name}-{tid:03}.txt"
+
+
+def generate_inverted_index(documents:list[tuple[int, str]], tid:int) -> list[str]:
     """
-    Generates an inverted index for all pages with IDs in range [start, end]
+    Generates sorted run files for the given (docID, filepath) pairs, which must be in docID order.
+    Returns the paths of the runs written, in docID order.
+    The shard's word counts, outgoing links and titles are written alongside the runs
     """
 
     # JSON keys: url, content (html), encoding
-    print(f"Thread {tid} now running!")
+    print(f"Worker {tid} now running!")
     start_time = time.time()
     postings = dict() # initialize fast inverted index
+    postings_size = 0 # postings + positions currently held in postings
+    run_paths = []
     with open(f"loggers/logger-{tid}.txt", "a") as log:
         log.write(f"Began indexing at time {start_time}\n")
-    stemmer = PS()
-    with shelve.open(f"partials/{INVERTED_INDEX_FILE_NAME}-{tid}", writeback=True) as omega: # shelve will be slow frequency data
-        for idx in range(start, end+1): # iterate through each file in the subdirectory
+    stemmer = CachedStemmer()
+    stemmer.load(STEM_CACHE_FILE_NAME)
+    with (open(_side_output_path("wordcounts", tid), "w") as wordcounts,
+          open(_side_output_path("outgoings", tid), "w") as outgoings,
+          open(_side_output_path("titles", tid), "w") as titles):
+        end = documents[-1][0]
+        for idx, filepath in documents: # iterate through each file in the shard
             data = dict()
-            filepath = ID_TO_FILE[idx]
             with open(f"loggers/logger-{tid}.txt", "a") as log:
                 log.write(f"Now reading {idx} at {filepath}\n")
             with open(filepath, "r") as json_file:
                 data = json.load(json_file) # load json file as dictionary
-            with open(f"contents/{TEMP_FILE_NAME}-{tid}.txt", 'w', encoding = 'UTF-8') as tempfile:
-                soupified = soup(data['content'], features='lxml') # create soup object
-
-                # write title text with weight 10
-                title_elements = soupified.find_all(['title'])
-                for element in title_elements:
-                    tempfile.write(f"{element.get_text()}\n" * 9)
-                del title_elements
-
-                # write strong, bold, italic text with weight 2
-                bold_elements = soupified.find_all(['strong', 'b', 'i'])
-                for element in bold_elements:
-                    tempfile.write(f"{element.get_text()}\n" * 1)
-                del bold_elements
-
-                # write h1 text with weight 7
-                h1_elements = soupified.find_all(['h1'])
-                for element in h1_elements:
-                    tempfile.write(f"{element.get_text()}\n" * 6)
-                del h1_elements
-
-                # write h2 text with weight 6
-                h2_elements = soupified.find_all(['h2'])
-                for element in h2_elements:
-                    tempfile.write(f"{element.get_text()}\n" * 5)
-                del h2_elements
-
-                # write h3 text with weight 5
-                h3_elements = soupified.find_all(['h3'])
-                for element in h3_elements:
-                    tempfile.write(f"{element.get_text()}\n" * 4)
-                del h3_elements
-
-                # write h4 text with weight 4
-                h4_elements = soupified.find_all(['h4'])
-                for element in h4_elements:
-                    tempfile.write(f"{element.get_text()}\n" * 3)
-                del h4_elements
-                
-                # write h5 text with weight 3
-                h5_elements = soupified.find_all(['h5'])
-                for element in h5_elements:
-                    tempfile.write(f"{element.get_text()}\n" * 2)
-                del h5_elements
-
-                # # save outgoing links to a separate shelve
-                # a_elements = soupified.find_all(['a'])
-                # with shelve.open(f"outgoings/{OUTGOING_LINKS_SAVE_NAME}-{tid}") as outgoing:
-                #     outgoing[str(idx)] = []
-                #     for element in a_elements:
-                #         if element.get('href') is not None:
-                #             outgoing[str(idx)].append(element.get('href'))
-
-                tempfile.write(soupified.get_text()) # write text content to temp file
-            
-            # tokenize tempfile
-            tempfile_tokens = reader.tokenize(f"contents/{TEMP_FILE_NAME}-{tid}.txt")
-            tempfile_tokens = [stemmer.stem(single_token) for single_token in tempfile_tokens]
+            analysis = analyzer.analyze(data['content']) # the one parse + walk of this page
+
+            # tokenize the page's text in memory, tagging each token with the fields it's in
+            page_tokens, field_masks = analysis.tokens()
+            page_tokens = [stemmer.stem(single_token) for single_token in page_tokens]
+
+            # the word count, outgoing links and title come out of the same walk
+            word_count = sum(1 for single_token in page_tokens if not filterer.evaluate_token(single_token))
+            wordcounts.write(f"{idx} {word_count}\n")
+            outgoings.write(f"{idx}|{json.dumps(analysis.hrefs)}\n")
+            titles.write(f"{idx} {analysis.title}\n")
+
             # function to iterate through tokens
                 # enumerate token and index in list for position
                 # returns dictionary mapping tokens to Posting objects
-            tempfile_postings = reader.post_tokens(idx, tempfile_tokens)
-            
+            page_postings = reader.post_tokens(idx, page_tokens, field_masks)
+        
             # add postings to fast postings variable
-            for token in tempfile_postings:
+            for token in page_postings:
                 if token in postings:
-                    postings[token].append(tempfile_postings[token])
+                    postings[token].append(page_postings[token])
                 else:
-                    postings[token] = [tempfile_postings[token]]
-            
-            # push fast postings variable data to shelve (disk) every 1000 files
-            if not idx % 1000 or idx == end:
+                    postings[token] = [page_postings[token]]
+                postings_size += 1 + page_postings[token].term_frequency
+
+            # flush a sorted run to disk once memory gets tight (and at the end of the range)
+            if postings_size >= MEMORY_LIMIT or idx == end:
                 with open(f"loggers/logger-{tid}.txt", "a") as log:
-                    log.write(f"Beginning Offloading at {time.time()}\n")
-                for token in postings:
-                    if token in omega:
-                        omega[token] += postings[token]
-                    else:
-                        omega[token] = postings[token]
+                    log.write(f"Writing run {len(run_paths)} at {time.time()}\n")
+                run_paths.append(_run_path(tid, len(run_paths)))
+                write_run(run_paths[-1], postings)
                 postings.clear()
+                postings_size = 0
                 with open(f"loggers/logger-{tid}.txt", "a") as log:
-                    log.write(f"Offloaded 1k files, time: {time.time()-start_time}\n")
+                    log.write(f"Wrote run, time: {time.time()-start_time}\n")
             # end for loop filename
-        # end for loop dirpath
-    # end with open shelve
-    os.remove(f"contents/{TEMP_FILE_NAME}-{tid}.txt")
+    stemmer.save(_stem_cache_path(tid))
+    with open(f"loggers/logger-{tid}.txt", "a") as log:
+        log.write(f"Stem cache stats: {stemmer.stats()}\n")
     print(f"tid_{tid} ending")
-                
+    return run_paths
+
+
+def _numbered_run(run_number:int, path:str):
+    """tags each record of a run with the run's number, which breaks ties
+    between runs holding the same term so they merge in docID order"""
+    for term, buf in read_run(path):
+        yield term, run_number, buf
 
 
-def initalize_threads() -> None:
+def merge_runs(run_paths:list[str], doc_count:int) -> None:
     """
-    Initializes a group of threads to target a portion of processing the json files
+    k-way merges the sorted run files into the final binary index.
+    runs are passed in docID order, so concatenating a term's postings
+    across runs (in run order) keeps its postings list sorted by docID.
+    The encoded lists are concatenated as they are (see postings.merge_encoded)
+    rather than decoded into Postings, so merging a term takes memory for
+    its skips, not for its postings and positions.
+    Terms rejected by filterer.evaluate_token are dropped here.
+    Every term's idf (over doc_count documents) goes into its lexicon record;
+    (the tf-idf weights and document norms are computed afterwards, see impacts.py)
     """
-    thread_1 = threading.Thread(target=generate_inverted_index, args=(0,2499,1))
-    thread_2 = threading.Thread(target=generate_inverted_index, args=(2500,4999,2))
-    thread_3 = threading.Thread(target=generate_inverted_index, args=(5000,7499,3))
-    thread_4 = threading.Thread(target=generate_inverted_index, args=(7500,9999,4))
-    thread_5 = threading.Thread(target=generate_inverted_index, args=(10000,14999,5))
-    thread_6 = threading.Thread(target=generate_inverted_index, args=(15000,19999,6))
-    thread_7 = threading.Thread(target=generate_inverted_index, args=(20000,24999,7))
-    thread_8 = threading.Thread(target=generate_inverted_index, args=(25000,29999,8))
-    thread_9 = threading.Thread(target=generate_inverted_index, args=(30000,34999,9))
-    thread_10 = threading.Thread(target=generate_inverted_index, args=(35000,39999,10))
-    thread_11 = threading.Thread(target=generate_inverted_index, args=(40000,44999,11))
-    thread_12 = threading.Thread(target=generate_inverted_index, args=(45000,49999,12))
-    thread_13 = threading.Thread(target=generate_inverted_index, args=(50000,55392,13))
-
-    thread_1.start()
-    thread_2.start()
-    thread_3.start()
-    thread_4.start()
-    thread_5.start()
-    thread_6.start()
-    thread_7.start()
-    thread_8.start()
-    thread_9.start()
-    thread_10.start()
-    thread_11.start()
-    thread_12.start()
-    thread_13.start()
-
-    thread_1.join()
-    thread_2.join()
-    thread_3.join()
-    thread_4.join()
-    thread_5.join()
-    thread_6.join()
-    thread_7.join()
-    thread_8.join()
-    thread_9.join()
-    thread_10.join()
-    thread_11.join()
-    thread_12.join()
-    thread_13.join()
-        
+    runs = [_numbered_run(run_number, path) for run_number, path in enumerate(run_paths)]
+
+    def write_term(term:str, term_bufs:list) -> None:
+        if filterer.evaluate_token(term):
+            return
+        df = sum(decode_df(buf) for buf in term_bufs)
+        writer.add_merged(term, term_bufs, ranker.idf(df, doc_count))
+
+    with IndexWriter() as writer:
+        current_term = None
+        current_bufs = [] # views into the (memory-mapped) runs, nothing is decoded
+        for term, _, buf in heapq.merge(*runs):
+            if term != current_term:
+                if current_term is not None:
+                    write_term(current_term, current_bufs)
+                current_term = term
+                current_bufs = []
+            current_bufs.append(buf)
+        if current_term is not None:
+            write_term(current_term, current_bufs)
+
+
+def write_side_outputs(shard_count:int) -> dict[int, int]:
+    """
+    Concatenates the workers' side outputs (in docID order) into
+    ID_WORDCOUNT.txt, the OMEGA_OUTGOING shelve and id-to-title.txt.
+    Returns the word count of every document
+    """
+    res = dict()
+    with open(WORDCOUNT_FILE_NAME, "w") as wordcounts:
+        for tid in range(shard_count):
+            with open(_side_output_path("wordcounts", tid), "r") as f:
+                line = f.readline()
+                while line:
+                    wordcounts.write(line)
+                    line = line.split()
+                    res[int(line[0])] = int(line[1])
+                    line = f.readline()
+    with open(TITLES_FILE_NAME, "w") as titles:
+        for tid in range(shard_count):
+            with open(_side_output_path("titles", tid), "r") as f:
+                shutil.copyfileobj(f, titles)
+    if os.path.exists(OUTGOING_FILE_NAME): os.remove(OUTGOING_FILE_NAME)
+    with shelve.open(OUTGOING_FILE_NAME) as omega:
+        for tid in range(shard_count):
+            with open(_side_output_path("outgoings", tid), "r") as f:
+                line = f.readline()
+                while line:
+                    doc_id, links = line.split("|", 1)
+                    omega[doc_id] = json.loads(links)
+                    line = f.readline()
+    return res
+
+
+def run_indexing() -> None:
+    """
+    Indexes every document in ID_TO_FILE with a pool of one process per core,
+    merges the runs they return into the final index, then weights it
+    """
+    if not ID_TO_FILE:
+        raise ValueError("no documents to index (is ID_TO_FILE loaded?)")
+    shards = shard_documents(os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max(1, len(shards))) as pool:
+        futures = [pool.submit(generate_inverted_index, shard, tid) for tid, shard in enumerate(shards)]
+        run_paths = [run_path for future in futures for run_path in future.result()]
+    id_wordcount = write_side_outputs(len(shards))
+    merge_runs(run_paths, len(id_wordcount))
+    impacts.compute_impacts(id_wordcount)
+    # fold every worker's stem cache into the one the next build (and the engine) starts from
+    stemmer = CachedStemmer()
+    for tid in range(len(shards)):
+        stemmer.load(_stem_cache_path(tid))
+    stemmer.save(STEM_CACHE_FILE_NAME)
+
 
 if __name__ == '__main__':
-    with open("id_to_file.txt", "r") as f:
-        line = f.readline().strip()
-        while line:
-            docID, url = int(line.split()[0]), line.split()[1]
-            ID_TO_FILE[docID] = url
-            line = f.readline().strip()
+    load_id_to_file()
     start_time = time.time()
-    if os.path.exists("contents"): rmdir("contents")
     if os.path.exists("loggers"): rmdir("loggers")
-    if os.path.exists("partials"): rmdir("partials")
-    if os.path.exists("outgoings"): rmdir("outgoings")
-    os.makedirs("contents")
+    if os.path.exists(RUNS_PATH): rmdir(RUNS_PATH)
     os.makedirs("loggers")
-    os.makedirs("partials")
-    os.makedirs("outgoings")
-    initalize_threads()
+    os.makedirs(RUNS_PATH)
+    run_indexing()
     print("--- %s seconds ---" % (time.time() - start_time))
@@ -0,0 +1,50 @@
+"""Computes the PageRank of every page from the link graph authoritator.py writes out (link_graph.npz).
+
+The graph is loaded into a sparse (CSR) transition matrix M, where M[i, j] = 1/outdegree(j)
+for every link j -> i, and the ranks are found by power iteration:
+
+    rank' = damping * (M @ rank + dangling mass / N) + (1 - damping) / N
+
+where the dangling mass is the rank sitting on pages with no outgoing links (which would
+otherwise leak out of the graph every iteration), spread evenly over every page.
+Iteration stops once the ranks move less than TOLERANCE (L1 distance) in an iteration.
+"""
+import sys
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+import ranker
+import impacts
+from authoritator import load_link_graph
+
+DAMPING = 0.80
+TOLERANCE = 1e-8 # L1 distance between two iterations' ranks at which they've converged
+MAX_ITERATIONS = 200
+
+
+def compute_pagerank(sources:np.ndarray, destinations:np.ndarray, page_count:int,
+        damping:float=DAMPING, tolerance:float=TOLERANCE, max_iterations:int=MAX_ITERATIONS) -> np.ndarray:
+    """runs power iteration over the link graph, returning the rank of every docID (summing to 1)"""
+    if not page_count:
+        return np.zeros(0)
+    out_degrees = np.bincount(sources, minlength=page_count).astype(np.float64)
+    # the out-degree is counted from the links themselves, so every column of M sums to 1
+    transitions = csr_matrix((1 / out_degrees[sources], (destinations, sources)), shape=(page_count, page_count))
+    dangling = out_degrees == 0
+    ranks = np.full(page_count, 1 / page_count)
+    for iteration in range(1, max_iterations + 1):
+        new_ranks = damping * (transitions @ ranks + ranks[dangling].sum() / page_count) + (1 - damping) / page_count
+        change = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if change < tolerance:
+            break
+    print(f"PageRank converged after {iteration} iterations (L1 change {change:.3g})")
+    return ranks
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+    damping = float(sys.argv[1]) if len(sys.argv) > 1 else DAMPING
+    ranker.write_pagerank(compute_pagerank(*load_link_graph(), damping=damping))
+    impacts.refresh_champions() # champions are picked partly by PageRank (and authority)
+    print("--- %s seconds ---" % (time.time() - start_time))
@@ -0,0 +1,849 @@
+"""Binary on-disk format for the inverted index.
+
+The index is split across three files (plus an optional fourth):
+
+    index.bin   - the postings file. Each term's postings list is stored as
+                  varint-encoded integers, laid out as
+                      df | skips | docID gaps (df) | block sizes | tfs (df) | fields (df) | position gaps (tf per doc)
+                  so the docIDs of a list can be decoded without touching its
+                  term frequencies or positions. The postings are cut into
+                  blocks of BLOCK_SIZE, and skips holds a skip pointer per block
+                  (its last docID, as a gap from the previous block's, and the
+                  length in bytes of its docID gaps), so a cursor can jump straight
+                  to the block a docID would be in and decode only that one.
+                  Block sizes likewise holds the length in bytes of every block's
+                  tfs, fields and positions, so the positions of a posting are
+                  found by decoding just its block's tfs (see PositionReader).
+                  The fields of a posting are a mask of the FIELDS it occurs in,
+                  followed by its frequency in each of those fields.
+    weights.bin - the tf-idf weight of every posting as a packed float32,
+                  in the same order as index.bin, so a term's weights are one
+                  contiguous array of df floats. IndexWriter only allocates it;
+                  the weights are filled in by impacts.py.
+    lexicon.bin - a sorted lexicon of fixed-width records
+                  (term offset, term length, postings offset, postings length, df,
+                  weights ordinal, max impact, idf) followed by the utf-8 bytes of every term.
+                  Since the records are fixed-width, a term is found with a binary
+                  search over the memory-mapped file; nothing needs to be parsed
+                  up front.
+    champions.bin - the champion list of every term with more than CHAMPION_SIZE
+                  postings: its CHAMPION_SIZE best postings (see impacts.py), in
+                  docID order. Laid out as a table of term number -> champion
+                  ordinal, then every champion's docID (uint32), then every
+                  champion's weight (float32).
+
+Run files (the sorted blocks the indexer flushes before merging) reuse the
+same postings encoding, prefixed by the term.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from cache import LRUCache
+from reader import Posting, FIELDS
+
+INDEX_FILE_NAME = "index.bin"
+WEIGHTS_FILE_NAME = "weights.bin"
+LEXICON_FILE_NAME = "lexicon.bin"
+CHAMPIONS_FILE_NAME = "champions.bin"
+
+LEXICON_MAGIC = b"LEX5"
+LEXICON_HEADER = struct.Struct("<4sI") # magic, number of terms
+LEXICON_RECORD = struct.Struct("<IHQIIQff")
+LexiconEntry = namedtuple("LexiconEntry", [
+    "term_offset", "term_length", # where the term's bytes are in the lexicon's string section
+    "postings_offset", "postings_length", # where its postings list is in index.bin
+    "df",
+    "weights_ordinal", # how many postings come before its own (its weights start at 4 * this in weights.bin)
+    "max_impact", # upper bound on weight / document norm over its postings (filled in by impacts.py)
+    "idf", # see ranker.idf
+])
+MAX_IMPACT_OFFSET = struct.calcsize("<IHQIIQ") # where max_impact sits in a record, for impacts.py to write it in place
+WEIGHT_SIZE = 4 # bytes per float32 weight
+BLOCK_SIZE = 128 # docIDs per skip pointer
+CHAMPIONS_MAGIC = b"CHM1"
+CHAMPIONS_HEADER = struct.Struct("<4sI") # magic, number of terms
+CHAMPION_SIZE = 500 # postings kept in a term's champion list
+RUN_RECORD_HEADER = struct.Struct("<HI") # term length, postings length
+
+
+# VARINT ENCODING
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """appends the varint encoding of a non-negative integer to out.
+    7 bits are stored per byte, with the high bit set on every byte but the last."""
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(buf, pos:int, count:int) -> tuple[list[int], int]:
+    """decodes count varints from buf starting at byte pos.
+    returns the decoded integers and the position right after the last one"""
+    values = []
+    value = 0
+    shift = 0
+    while count:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+            count -= 1
+    return values, pos
+
+
+def _undelta(gaps:list[int], total:int=0) -> list[int]:
+    """turns a list of gaps (from total) back into the absolute values they encode"""
+    values = []
+    for gap in gaps:
+        total += gap
+        values.append(total)
+    return values
+
+
+# POSTINGS ENCODING
+
+def _encode_fields(field_frequencies:list[int] | None, out:bytearray) -> None:
+    """encodes the field frequencies of a posting as a mask of its
+    non-zero fields followed by those fields' frequencies"""
+    if not field_frequencies:
+        out.append(0)
+        return
+    mask = 0
+    for field, frequency in enumerate(field_frequencies):
+        if frequency:
+            mask |= 1 << field
+    encode_varint(mask, out)
+    for frequency in field_frequencies:
+        if frequency:
+            encode_varint(frequency, out)
+
+
+def _decode_fields(buf, pos:int) -> tuple[list[int] | None, int]:
+    """inverse of _encode_fields"""
+    (mask,), pos = decode_varints(buf, pos, 1)
+    if not mask:
+        return None, pos
+    field_frequencies = [0] * len(FIELDS)
+    for field in range(len(FIELDS)):
+        if mask >> field & 1:
+            (field_frequencies[field],), pos = decode_varints(buf, pos, 1)
+    return field_frequencies, pos
+
+
+def encode_postings(postings:list[Posting]) -> bytes:
+    """encodes a docID-sorted postings list into its binary form"""
+    out = bytearray()
+    encode_varint(len(postings), out)
+    blocks, sizes, tfs, fields, positions = bytearray(), bytearray(), bytearray(), bytearray(), bytearray()
+    previous = 0
+    for start in range(0, len(postings), BLOCK_SIZE):
+        block_starts = (len(blocks), len(tfs), len(fields), len(positions))
+        block_last = previous
+        for posting in postings[start:start + BLOCK_SIZE]:
+            encode_varint(posting.document_id - previous, blocks)
+            previous = posting.document_id
+            encode_varint(posting.term_frequency, tfs)
+            _encode_fields(posting.field_frequencies, fields)
+            previous_position = 0
+            for position in posting.positions:
+                encode_varint(position - previous_position, positions)
+                previous_position = position
+        encode_varint(previous - block_last, out)
+        encode_varint(len(blocks) - block_starts[0], out)
+        encode_varint(len(tfs) - block_starts[1], sizes)
+        encode_varint(len(fields) - block_starts[2], sizes)
+        encode_varint(len(positions) - block_starts[3], sizes)
+    out += blocks
+    out += sizes
+    out += tfs
+    out += fields
+    out += positions
+    return bytes(out)
+
+
+def _block_count(df:int) -> int:
+    return (df + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+
+def decode_df(buf) -> int:
+    """the number of postings in an encoded postings list"""
+    return decode_varints(buf, 0, 1)[0][0]
+
+
+def decode_skips(buf) -> tuple[int, list[int], list[int]]:
+    """decodes the header of an encoded postings list: its df, the last docID of each
+    of its blocks of docID gaps and the starting byte of each block (followed by the
+    byte right after the last one, where the tfs start)"""
+    (df,), pos = decode_varints(buf, 0, 1)
+    skips, pos = decode_varints(buf, pos, 2 * _block_count(df))
+    block_lasts = _undelta(skips[0::2])
+    return df, block_lasts, [pos] + _undelta(skips[1::2], pos)
+
+
+PostingsLayout = namedtuple("PostingsLayout", [
+    "df",
+    "block_lasts", # the last docID of each block
+    # the byte each block starts at in each section, followed by the byte right after the section
+    "doc_starts", "tf_starts", "field_starts", "position_starts",
+])
+
+
+def decode_layout(buf) -> PostingsLayout:
+    """decodes both the skips and the block sizes of an encoded postings list,
+    i.e. where every block of its docIDs, tfs, fields and positions is"""
+    df, block_lasts, doc_starts = decode_skips(buf)
+    sizes, pos = decode_varints(buf, doc_starts[-1], 3 * _block_count(df))
+    tf_starts = [pos] + _undelta(sizes[0::3], pos)
+    field_starts = [tf_starts[-1]] + _undelta(sizes[1::3], tf_starts[-1])
+    position_starts = [field_starts[-1]] + _undelta(sizes[2::3], field_starts[-1])
+    return PostingsLayout(df, block_lasts, doc_starts, tf_starts, field_starts, position_starts)
+
+
+def _skip_varints(buf, pos:int, count:int) -> int:
+    """returns the position right after the next count varints in buf, without decoding them"""
+    while count:
+        if buf[pos] < 0x80: # the last byte of a varint
+            count -= 1
+        pos += 1
+    return pos
+
+
+def _skip_fields(buf, pos:int, count:int) -> int:
+    """returns the position right after the next count postings' fields in buf"""
+    for _ in range(count):
+        (mask,), pos = decode_varints(buf, pos, 1)
+        pos = _skip_varints(buf, pos, bin(mask).count("1"))
+    return pos
+
+
+class PositionReader:
+    """Reads the positions of a postings list's postings on demand, for postings asked
+    for in increasing order (e.g. the ones a cursor lands on). Only the block sizes are
+    decoded up front; the tfs of a block are decoded once a posting in it is asked for,
+    the positions of the postings in between are skipped over without being decoded,
+    and the blocks no posting is asked for aren't read at all."""
+    def __init__(self, buf):
+        self.buf = buf
+        self.layout = decode_layout(buf)
+        self.block = -1
+        self.tfs = [] # of the current block
+        self.pos = 0 # where the positions of posting number self.next start
+        self.next = 0
+
+    def positions(self, posting_number:int) -> list[int]:
+        """the positions of the posting_number-th posting of the list"""
+        if posting_number < self.next:
+            raise ValueError(f"positions of posting {posting_number} asked for after {self.next - 1}")
+        block = posting_number // BLOCK_SIZE
+        first = block * BLOCK_SIZE
+        if block != self.block:
+            self.tfs, _ = decode_varints(self.buf, self.layout.tf_starts[block], min(BLOCK_SIZE, self.layout.df - first))
+            self.block = block
+            self.pos = self.layout.position_starts[block]
+            self.next = first
+        self.pos = _skip_varints(self.buf, self.pos, sum(self.tfs[self.next - first:posting_number - first]))
+        gaps, self.pos = decode_varints(self.buf, self.pos, self.tfs[posting_number - first])
+        self.next = posting_number + 1
+        return _undelta(gaps)
+
+
+def decode_doc_ids(buf) -> list[int]:
+    """decodes only the docIDs of an encoded postings list"""
+    (df,), pos = decode_varints(buf, 0, 1)
+    _, pos = decode_varints(buf, pos, 2 * _block_count(df))
+    gaps, _ = decode_varints(buf, pos, df)
+    return _undelta(gaps)
+
+
+def decode_postings(buf) -> list[Posting]:
+    """decodes an encoded postings list into Posting objects"""
+    (df,), pos = decode_varints(buf, 0, 1)
+    _, pos = decode_varints(buf, pos, 2 * _block_count(df))
+    gaps, pos = decode_varints(buf, pos, df)
+    _, pos = decode_varints(buf, pos, 3 * _block_count(df))
+    tfs, pos = decode_varints(buf, pos, df)
+    fields = []
+    for _ in range(df):
+        field_frequencies, pos = _decode_fields(buf, pos)
+        fields.append(field_frequencies)
+    postings = []
+    for doc_id, tf, field_frequencies in zip(_undelta(gaps), tfs, fields):
+        position_gaps, pos = decode_varints(buf, pos, tf)
+        postings.append(Posting(doc_id, tf, _undelta(position_gaps), field_frequencies))
+    return postings
+
+
+# RUN FILES
+
+def write_run(path:str, postings:dict[str, list[Posting]]) -> None:
+    """writes an in-memory block of postings out as a term-sorted run file.
+    each record is a header, the term, then its encoded postings list"""
+    with open(path, "wb") as run:
+        for term in sorted(postings):
+            term_bytes = term.encode("UTF-8")
+            encoded = encode_postings(postings[term])
+            run.write(RUN_RECORD_HEADER.pack(len(term_bytes), len(encoded)))
+            run.write(term_bytes)
+            run.write(encoded)
+
+
+def read_run(path:str):
+    """streams the (term, encoded postings) records of a run file in term order.
+    the run is memory-mapped and each encoded postings list is a view into it,
+    so a record isn't copied into memory until it's actually read"""
+    run = memoryview(_map_file(path))
+    pos = 0
+    while pos < len(run):
+        term_length, postings_length = RUN_RECORD_HEADER.unpack_from(run, pos)
+        pos += RUN_RECORD_HEADER.size
+        term = bytes(run[pos:pos + term_length]).decode("UTF-8")
+        pos += term_length
+        yield term, run[pos:pos + postings_length]
+        pos += postings_length
+
+
+def _posting_offsets(buf, layout:PostingsLayout, posting_number:int) -> tuple[int, int, int, int]:
+    """where a posting (or, for posting df, the end of the list) starts in each section of
+    an encoded list (docID gaps, tfs, fields, positions), relative to the section's start.
+    only the part of its block before it is read"""
+    if posting_number == layout.df:
+        starts = (layout.doc_starts, layout.tf_starts, layout.field_starts, layout.position_starts)
+        return tuple(section[-1] - section[0] for section in starts)
+    block = posting_number // BLOCK_SIZE
+    before = posting_number - block * BLOCK_SIZE # postings of its block before it
+    tfs, tf_offset = decode_varints(buf, layout.tf_starts[block], before)
+    return (_skip_varints(buf, layout.doc_starts[block], before) - layout.doc_starts[0],
+            tf_offset - layout.tf_starts[0],
+            _skip_fields(buf, layout.field_starts[block], before) - layout.field_starts[0],
+            _skip_varints(buf, layout.position_starts[block], sum(tfs)) - layout.position_starts[0])
+
+
+def _doc_id(buf, layout:PostingsLayout, posting_number:int) -> int:
+    """the docID of a posting of an encoded list, decoding only its block up to it"""
+    block = posting_number // BLOCK_SIZE
+    gaps, _ = decode_varints(buf, layout.doc_starts[block], posting_number - block * BLOCK_SIZE + 1)
+    return _undelta(gaps, layout.block_lasts[block - 1] if block else 0)[-1]
+
+
+def merge_encoded(bufs:list, out) -> tuple[int, int]:
+    """
+    Writes encoded postings lists, each of whose docIDs all come after the list before's
+    (e.g. a term's lists from consecutive runs), to the file out as one encoded list.
+    returns its df and length in bytes.
+
+    the lists' docID gaps, tfs, fields and positions are copied through as they are, but
+    for the first docID gap of each list, which is re-based on the last docID of the list
+    before it. the skips and block sizes are rebuilt from the lists' own, and only where a
+    block of the merged list ends partway through a list's block does that block get read
+    (up to the boundary). so nothing but the skips is held in memory, however long the lists
+    """
+    lists = [(buf, layout) for buf in bufs if (layout := decode_layout(buf)).df]
+    df = sum(layout.df for _, layout in lists)
+    firsts = [] # the number of the first posting of each list in the merged list
+    first_gaps = [] # (re-based first docID gap, where the rest of its docID gaps start) of each list
+    bases = [] # where each list starts in each section of the merged list
+    base = (0, 0, 0, 0)
+    previous = 0
+    posting_count = 0
+    for buf, layout in lists:
+        firsts.append(posting_count)
+        posting_count += layout.df
+        (first,), rest = decode_varints(buf, layout.doc_starts[0], 1)
+        gap = bytearray()
+        encode_varint(first - previous, gap)
+        first_gaps.append((gap, rest))
+        bases.append(base)
+        lengths = _posting_offsets(buf, layout, layout.df)
+        base = (base[0] + len(gap) + lengths[0] - (rest - layout.doc_starts[0]),
+                base[1] + lengths[1], base[2] + lengths[2], base[3] + lengths[3])
+        previous = layout.block_lasts[-1]
+
+    def offsets(posting_number:int) -> tuple[int, int, int, int]:
+        """where a posting of the merged list (or its end) starts in each of its sections"""
+        if posting_number == df:
+            return base
+        i = bisect_right(firsts, posting_number) - 1
+        buf, layout = lists[i]
+        local = _posting_offsets(buf, layout, posting_number - firsts[i])
+        gap, rest = first_gaps[i]
+        doc_offset = local[0] + len(gap) - (rest - layout.doc_starts[0]) if posting_number > firsts[i] else 0
+        return (bases[i][0] + doc_offset, bases[i][1] + local[1], bases[i][2] + local[2], bases[i][3] + local[3])
+
+    def doc_id(posting_number:int) -> int:
+        i = bisect_right(firsts, posting_number) - 1
+        return _doc_id(*lists[i], posting_number - firsts[i])
+
+    head, sizes = bytearray(), bytearray()
+    encode_varint(df, head)
+    block_last, block_start = 0, (0, 0, 0, 0)
+    for block in range(_block_count(df)):
+        end = min(block * BLOCK_SIZE + BLOCK_SIZE, df)
+        last, block_end = doc_id(end - 1), offsets(end)
+        encode_varint(last - block_last, head)
+        encode_varint(block_end[0] - block_start[0], head)
+        for section in (1, 2, 3):
+            encode_varint(block_end[section] - block_start[section], sizes)
+        block_last, block_start = last, block_end
+    out.write(head)
+    for (buf, layout), (gap, rest) in zip(lists, first_gaps):
+        out.write(gap)
+        out.write(buf[rest:layout.doc_starts[-1]])
+    out.write(sizes)
+    for section in ("tf_starts", "field_starts", "position_starts"):
+        for buf, layout in lists:
+            starts = getattr(layout, section)
+            out.write(buf[starts[0]:starts[-1]])
+    return df, len(head) + len(sizes) + sum(base)
+
+
+# WRITING
+
+class IndexWriter:
+    """Writes a binary index one term at a time.
+    Terms must be added in sorted order, which is what the lexicon's binary search relies on."""
+    def __init__(self, index_path:str=INDEX_FILE_NAME, lexicon_path:str=LEXICON_FILE_NAME,
+            weights_path:str=WEIGHTS_FILE_NAME):
+        self.lexicon_path = lexicon_path
+        self.weights_path = weights_path
+        self.index_file = open(index_path, "wb")
+        self.records = bytearray()
+        self.terms = bytearray()
+        self.term_count = 0
+        self.offset = 0
+        self.ordinal = 0
+        self.last_term = None
+
+    def add(self, term:str, postings:list[Posting], idf:float) -> None:
+        """appends the postings list of a term (and its idf) to the index"""
+        self._check_order(term)
+        encoded = encode_postings(postings)
+        self.index_file.write(encoded)
+        self._add_record(term, len(postings), len(encoded), idf)
+
+    def add_merged(self, term:str, bufs:list, idf:float) -> None:
+        """appends the postings list of a term given as encoded lists to be concatenated
+        (e.g. its lists from every run, in docID order), without decoding them (see merge_encoded)"""
+        self._check_order(term)
+        df, length = merge_encoded(bufs, self.index_file)
+        self._add_record(term, df, length, idf)
+
+    def _check_order(self, term:str) -> None:
+        if self.last_term is not None and term <= self.last_term:
+            raise ValueError(f"terms must be added in sorted order: {term!r} after {self.last_term!r}")
+
+    def _add_record(self, term:str, df:int, length:int, idf:float) -> None:
+        """adds the lexicon record of a term whose postings list was just written"""
+        term_bytes = term.encode("UTF-8")
+        self.records += LEXICON_RECORD.pack(len(self.terms), len(term_bytes), self.offset, length,
+                                            df, self.ordinal, 0.0, idf)
+        self.terms += term_bytes
+        self.offset += length
+        self.ordinal += df
+        self.term_count += 1
+        self.last_term = term
+
+    def close(self) -> None:
+        """flushes the postings file, writes out the lexicon and allocates
+        the (zeroed) weights file for the impacts stage to fill in"""
+        self.index_file.close()
+        with open(self.weights_path, "wb") as weights:
+            weights.truncate(self.ordinal * WEIGHT_SIZE)
+        with open(self.lexicon_path, "wb") as lexicon:
+            lexicon.write(LEXICON_HEADER.pack(LEXICON_MAGIC, self.term_count))
+            lexicon.write(self.records)
+            lexicon.write(self.terms)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_champions(path:str, counts, doc_ids, weights) -> None:
+    """writes the champion lists of every term in the lexicon, given the number of
+    champions of each term (0 if it has none) and all of their docIDs and weights"""
+    with open(path, "wb") as f:
+        f.write(CHAMPIONS_HEADER.pack(CHAMPIONS_MAGIC, len(counts)))
+        offsets = array('Q', [0])
+        for count in counts:
+            offsets.append(offsets[-1] + count)
+        offsets.tofile(f)
+        array('I', doc_ids).tofile(f)
+        array('f', weights).tofile(f)
+
+
+# READING
+
+END_OF_POSTINGS = sys.maxsize # the docID of an exhausted cursor, larger than any real one
+
+
+def _gallop(values, target:int, low:int) -> int:
+    """the first index from low on whose value is >= target (len(values) if there's none).
+    gallops ahead (1, 2, 4, ... values) to bracket the target, then binary searches the
+    bracket, so skipping n values costs O(log n) rather than O(n)"""
+    step = 1
+    high = low
+    while high < len(values) and values[high] < target:
+        low = high + 1
+        high += step
+        step *= 2
+    return bisect_left(values, target, low, min(high, len(values)))
+
+
+class PostingsCursor:
+    """Walks through a postings list held in memory in docID order, for document-at-a-time
+    scoring. doc_id is the current posting's docID (END_OF_POSTINGS once it's exhausted)
+    and weight its tf-idf weight."""
+    def __init__(self, doc_ids:list[int], weights):
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.position = 0
+        self.doc_id = doc_ids[0] if doc_ids else END_OF_POSTINGS
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def weight(self) -> float:
+        return self.weights[self.position]
+
+    @property
+    def posting_number(self) -> int:
+        """where the current posting is in the list"""
+        return self.position
+
+    def next(self) -> int:
+        """moves on to the next posting, returning its docID"""
+        self.position += 1
+        self.doc_id = self.doc_ids[self.position] if self.position < len(self.doc_ids) else END_OF_POSTINGS
+        return self.doc_id
+
+    def seek(self, target:int) -> int:
+        """moves on to the first posting with a docID >= target, returning its docID"""
+        if self.doc_id >= target:
+            return self.doc_id
+        self.position = _gallop(self.doc_ids, target, self.position + 1)
+        self.doc_id = self.doc_ids[self.position] if self.position < len(self.doc_ids) else END_OF_POSTINGS
+        return self.doc_id
+
+
+class BlockCursor(PostingsCursor):
+    """A PostingsCursor straight over an encoded postings list.
+    Only the skip pointers are decoded up front; a block of docIDs is decoded once
+    the cursor gets to it, and seek() gallops over the skip pointers so the blocks
+    it jumps past are never decoded at all.
+    skips are the list's decode_skips, if they've been decoded already. blocks, if given,
+    holds the list's decoded blocks (None for one not decoded yet) and is shared by every
+    cursor over the list, so each block is only decoded by the first of them to get to it."""
+    def __init__(self, buf, weights, skips=None, blocks=None):
+        self.buf = buf
+        self.weights = weights
+        self.df, self.block_lasts, self.block_starts = skips or decode_skips(buf)
+        self.blocks = blocks
+        self.block = -1
+        self.doc_ids = []
+        self.position = 0
+        self.doc_id = END_OF_POSTINGS
+        if self.df:
+            self._load_block(0)
+
+    def __len__(self) -> int:
+        return self.df
+
+    def _load_block(self, block:int) -> None:
+        """decodes a block of docIDs and moves to its first posting"""
+        doc_ids = self.blocks[block] if self.blocks is not None else None
+        if doc_ids is None:
+            first = block * BLOCK_SIZE
+            gaps, _ = decode_varints(self.buf, self.block_starts[block], min(BLOCK_SIZE, self.df - first))
+            doc_ids = _undelta(gaps, self.block_lasts[block - 1] if block else 0)
+            if self.blocks is not None:
+                self.blocks[block] = doc_ids
+        self.block = block
+        self.doc_ids = doc_ids
+        self.position = 0
+        self.doc_id = self.doc_ids[0]
+
+    @property
+    def weight(self) -> float:
+        return self.weights[self.block * BLOCK_SIZE + self.position]
+
+    @property
+    def posting_number(self) -> int:
+        return self.block * BLOCK_SIZE + self.position
+
+    def next(self) -> int:
+        if self.doc_id == END_OF_POSTINGS:
+            return self.doc_id
+        self.position += 1
+        if self.position < len(self.doc_ids):
+            self.doc_id = self.doc_ids[self.position]
+        elif self.block + 1 < len(self.block_lasts):
+            self._load_block(self.block + 1)
+        else:
+            self.doc_id = END_OF_POSTINGS
+        return self.doc_id
+
+    def seek(self, target:int) -> int:
+        if self.doc_id >= target:
+            return self.doc_id
+        if target > self.block_lasts[self.block]: # it's in a later block (if any)
+            block = _gallop(self.block_lasts, target, self.block + 1)
+            if block == len(self.block_lasts):
+                self.position = len(self.doc_ids)
+                self.doc_id = END_OF_POSTINGS
+                return self.doc_id
+            self._load_block(block)
+            if self.doc_id >= target:
+                return self.doc_id
+        return super().seek(target)
+
+
+def intersect(cursors:list[PostingsCursor]):
+    """
+    Yields every docID that's in all of the cursors' postings lists, in order
+    (with every cursor sitting on it, so their weights can be read).
+    the shortest list leads and the others seek to each of its docIDs, longest last,
+    so an intersection costs about the length of the shortest list (times a log)
+    rather than the sum of their lengths
+    """
+    if not cursors:
+        return
+    cursors = sorted(cursors, key=len)
+    lead = cursors[0]
+    doc_id = lead.doc_id
+    while doc_id != END_OF_POSTINGS:
+        for cursor in cursors[1:]:
+            if cursor.seek(doc_id) != doc_id:
+                doc_id = lead.seek(cursor.doc_id) # nothing before cursor's docID can be in all of them
+                break
+        else:
+            yield doc_id
+            doc_id = lead.next()
+
+
+def _map_file(path:str):
+    """memory-maps a file read-only (an empty file can't be mapped, so it becomes b"")"""
+    if not os.path.getsize(path):
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class IndexReader:
+    """Read-only view of a binary index.
+    All three files are memory-mapped, so only the pages of the lexicon,
+    postings and weights that are actually looked up get read from disk.
+    With a postings_cache_size, the skips and decoded blocks of the most recently used terms
+    are kept around too, so the cursors of hot terms skip the lexicon lookup and the decoding."""
+    def __init__(self, index_path:str=INDEX_FILE_NAME, lexicon_path:str=LEXICON_FILE_NAME,
+            weights_path:str=WEIGHTS_FILE_NAME, champions_path:str=CHAMPIONS_FILE_NAME, postings_cache_size:int=0):
+        self.lexicon = _map_file(lexicon_path)
+        magic, self.term_count = LEXICON_HEADER.unpack_from(self.lexicon, 0)
+        if magic != LEXICON_MAGIC:
+            raise ValueError(f"{lexicon_path} is not a lexicon file")
+        self.terms_start = LEXICON_HEADER.size + self.term_count * LEXICON_RECORD.size
+        self.postings_map = _map_file(index_path)
+        self.weights_map = _map_file(weights_path)
+        self.weights_view = memoryview(self.weights_map)
+        self._map_champions(champions_path)
+        self.postings_cache = LRUCache(postings_cache_size) if postings_cache_size else None
+
+    def _map_champions(self, champions_path:str) -> None:
+        """maps the champion lists, if they've been written for this index"""
+        self.champions_map = b""
+        self.champion_offsets = self.champion_doc_ids = self.champion_weights = None
+        if not os.path.exists(champions_path):
+            return
+        self.champions_map = _map_file(champions_path)
+        magic, term_count = CHAMPIONS_HEADER.unpack_from(self.champions_map, 0)
+        if magic != CHAMPIONS_MAGIC or term_count != self.term_count: # left over from another index
+            return
+        view = memoryview(self.champions_map)
+        ids_start = CHAMPIONS_HEADER.size + 8 * (term_count + 1)
+        self.champion_offsets = view[CHAMPIONS_HEADER.size:ids_start].cast('Q')
+        champion_count = self.champion_offsets[-1]
+        self.champion_doc_ids = view[ids_start:ids_start + 4 * champion_count].cast('I')
+        self.champion_weights = view[ids_start + 4 * champion_count:ids_start + 8 * champion_count].cast('f')
+
+    def _record(self, i:int) -> LexiconEntry:
+        return LexiconEntry._make(LEXICON_RECORD.unpack_from(self.lexicon, LEXICON_HEADER.size + i * LEXICON_RECORD.size))
+
+    def _term_bytes(self, record:LexiconEntry) -> bytes:
+        start = self.terms_start + record.term_offset
+        return self.lexicon[start:start + record.term_length]
+
+    def _find_index(self, term:str) -> tuple[int, LexiconEntry | None]:
+        """binary searches the lexicon for a term, returning its number and record (or -1, None)"""
+        key = term.encode("UTF-8")
+        low, high = 0, self.term_count
+        while low < high:
+            mid = (low + high) // 2
+            record = self._record(mid)
+            mid_key = self._term_bytes(record)
+            if mid_key < key:
+                low = mid + 1
+            elif mid_key > key:
+                high = mid
+            else:
+                return mid, record
+        return -1, None
+
+    def _find(self, term:str) -> LexiconEntry | None:
+        """binary searches the lexicon for a term, returning its record (or None)"""
+        return self._find_index(term)[1]
+
+    def __contains__(self, term:str) -> bool:
+        return self._find(term) is not None
+
+    def __len__(self) -> int:
+        return self.term_count
+
+    def __iter__(self):
+        """iterates through every term in sorted order"""
+        for i in range(self.term_count):
+            yield self._term_bytes(self._record(i)).decode("UTF-8")
+
+    def dfs(self):
+        """iterates through every (term, df) pair in sorted order,
+        without touching the postings file"""
+        for i in range(self.term_count):
+            record = self._record(i)
+            yield self._term_bytes(record).decode("UTF-8"), record.df
+
+    def df(self, term:str) -> int:
+        """document frequency of a term (0 if it isn't in the index)"""
+        record = self._find(term)
+        return record.df if record else 0
+
+    def raw_postings(self, term:str) -> bytes:
+        """the encoded postings list of a term, read with a single slice of the postings file"""
+        record = self._find(term)
+        if record is None:
+            return b""
+        return self.postings_map[record.postings_offset:record.postings_offset + record.postings_length]
+
+    def weights(self, term:str) -> memoryview:
+        """the tf-idf weights of a term's postings (in postings order), as a float32 view
+        straight into the memory-mapped weights file; nothing is copied or parsed"""
+        record = self._find(term)
+        if record is None:
+            return memoryview(b"").cast('f')
+        return self.entry_weights(record)
+
+    def entry_weights(self, record:LexiconEntry) -> memoryview:
+        """same as weights(), for a lexicon entry that's already been looked up (see scan)"""
+        start = record.weights_ordinal * WEIGHT_SIZE
+        return self.weights_view[start:start + record.df * WEIGHT_SIZE].cast('f')
+
+    def idf(self, term:str) -> float:
+        """the idf of a term, as computed when the index was built (0 if it isn't in the index)"""
+        record = self._find(term)
+        return record.idf if record else 0.0
+
+    def max_impact(self, term:str) -> float:
+        """the largest weight / document norm of any of a term's postings (0 if it isn't in the index)"""
+        record = self._find(term)
+        return record.max_impact if record else 0.0
+
+    def cursor(self, term:str) -> PostingsCursor:
+        """a cursor over a term's docIDs and weights (see BlockCursor),
+        sharing its decoded blocks through the postings cache if there is one"""
+        if self.postings_cache is not None:
+            return self._cached_cursor(term)
+        record = self._find(term)
+        if record is None:
+            return PostingsCursor([], [])
+        buf = self.postings_map[record.postings_offset:record.postings_offset + record.postings_length]
+        return BlockCursor(buf, self.entry_weights(record))
+
+    def _cached_cursor(self, term:str) -> PostingsCursor:
+        """a BlockCursor over a term's postings list that shares its skips and decoded blocks
+        with every other cursor over it while it's in the cache. a miss decodes nothing but
+        the skips, so a cold term costs what it would without the cache"""
+        cached = self.postings_cache.get(term)
+        if cached is None:
+            record = self._find(term)
+            if record is None:
+                return PostingsCursor([], [])
+            buf = self.postings_map[record.postings_offset:record.postings_offset + record.postings_length]
+            cached = (record, buf, decode_skips(buf), [None] * _block_count(record.df))
+            self.postings_cache.put(term, cached)
+        record, buf, skips, blocks = cached
+        return BlockCursor(buf, self.entry_weights(record), skips, blocks)
+
+    def positions(self, term:str) -> PositionReader | None:
+        """a PositionReader over a term's postings list (None if it isn't in the index)"""
+        buf = self.raw_postings(term)
+        return PositionReader(buf) if buf else None
+
+    def champion_cursor(self, term:str) -> PostingsCursor:
+        """a PostingsCursor over a term's champion list; for a term without one
+        (i.e. with at most CHAMPION_SIZE postings), that's its whole postings list"""
+        i, record = self._find_index(term)
+        if record is None or self.champion_offsets is None:
+            return self.cursor(term)
+        start, stop = self.champion_offsets[i], self.champion_offsets[i + 1]
+        if start == stop:
+            return self.cursor(term)
+        return PostingsCursor(self.champion_doc_ids[start:stop], self.champion_weights[start:stop])
+
+    def posting_count(self) -> int:
+        """total number of postings in the index (i.e. the number of weights in weights.bin)"""
+        if not self.term_count:
+            return 0
+        last = self._record(self.term_count - 1)
+        return last.weights_ordinal + last.df
+
+    def ordinal(self, i:int) -> int:
+        """how many postings come before the i-th term's"""
+        return self._record(i).weights_ordinal if i < self.term_count else self.posting_count()
+
+    def scan(self, start:int=0, stop:int | None=None):
+        """streams (term, lexicon entry, encoded postings) for the terms
+        start..stop-1 in sorted order, reading the postings file sequentially"""
+        for i in range(start, self.term_count if stop is None else stop):
+            record = self._record(i)
+            buf = self.postings_map[record.postings_offset:record.postings_offset + record.postings_length]
+            yield self._term_bytes(record).decode("UTF-8"), record, buf
+
+    def doc_ids(self, term:str) -> list[int]:
+        """the docIDs in a term's postings list"""
+        buf = self.raw_postings(term)
+        return decode_doc_ids(buf) if buf else []
+
+    def postings(self, term:str) -> list[Posting]:
+        """the full postings list (tfs and positions included) of a term"""
+        buf = self.raw_postings(term)
+        return decode_postings(buf) if buf else []
+
+    def close(self) -> None:
+        if self.postings_cache is not None:
+            self.postings_cache.clear()
+        self.weights_view.release()
+        for view in (self.champion_offsets, self.champion_doc_ids, self.champion_weights):
+            if view is not None:
+                view.release()
+        for mapped in (self.lexicon, self.postings_map, self.weights_map, self.champions_map):
+            if isinstance(mapped, mmap.mmap):
+                try:
+                    mapped.close()
+                except BufferError: # a weights view handed out is still alive; it's unmapped once that's gone
+                    pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,162 +1,276 @@
 """This module contains functions for computing the relevance score of a document."""
 import math
-import json
-
-
-def _get_outgoing_link_stats() -> dict[int:int]:
-    """gets the number of outgoing links for each page.
-    returns dict in form[docID:numLinks]"""
-    res = dict()
-    with open("ID_NUM_OUTGOINGS.txt", "r") as f:
-        line = f.readline()
-        while line:
-            line = line.split()
-            res[int(line[0])] = int(line[1])
-            line = f.readline()
-    return res
-
-
-def _get_incoming_link_stats() -> dict[int:list[int]]:
-    """gest the (IDs of) incoming links for each page"""
-    res = dict()
-    with open("ID_INCOMING_LIST.txt", "r") as f:
-        line = f.readline()
-        while line:
-            line = line.split("|")
-            res[int(line[0])] = [int(docID) for docID in json.loads(line[1].strip())]
-            line = f.readline()
-    return res
-
-
-
-def compute_pagerank(index_of_index:dict) -> dict:
-    """Computes the pagerank scores of all pages based off 
-    the outgoing & incoming links for each one.
-    
-    function computePageRank(pages, dampingFactor, numIterations):
-    N = number of pages
-    pageRank = initialize dictionary with page as key and 1/N as value for each page
-    newPageRank = initialize dictionary with page as key and 0 as value for each page
-    outgoingLinks = initialize dictionary with page as key and number of outgoing links as value
-
-    for each page in pages:
-        outgoingLinks[page] = count of outgoing links from page
-
-    for i from 1 to numIterations:
-        for each page in pages:
-            newPageRank[page] = (1 - dampingFactor) / N
-            for each incomingLink in getIncomingLinks(page):
-                newPageRank[page] += dampingFactor * (pageRank[incomingLink] / outgoingLinks[incomingLink])
-
-        for each page in pages:
-            pageRank[page] = newPageRank[page]
-
-    return pageRank
-    """
-    # use if pagerank.txt exists
-    res = dict()
-    with open('pagerank.txt', 'r') as f:
-        line = f.readline()
-        while line:
-            line = line.split('|')
-            res[int(line[0])] = float(line[1])
-            line = f.readline()
-    return res
-
-    # use the following if it doesn't.
-    N = 55393
-    damping = 0.80
-    pageRank = {i: 1/N for i in range(N+1)}
-    newPageRank = {i: 0 for i in range(N+1)}
-    outgoingLinks = _get_outgoing_link_stats()
-    incomingLinks = _get_incoming_link_stats()
-
-    for _ in range(N+1):
-        print(_)
-        for pageID in range(N+1):
-            print(pageID)
-            newPageRank[pageID] = (1 - damping) / N
-            if pageID in incomingLinks:
-                for linkID in incomingLinks[pageID]:
-                    newPageRank[pageID] += damping * (pageRank[linkID] / outgoingLinks[linkID])
-        for pageID in range(N+1):
-            print(pageID)
-            pageRank[pageID] = newPageRank[pageID]
-    """
-    with open('pagerank.txt', 'a') as f: # uncomment if file already exists
-        for key, value in pageRank.items():
-            f.write(f"{key}|{value}\n")"""
-    return pageRank
+import heapq
+from array import array
+from itertools import zip_longest
+from reader import FIELDS
+from postings import END_OF_POSTINGS, intersect
+
+DOC_NORMS_FILE_NAME = "doc_norms.bin"
+PAGERANK_FILE_NAME = "pagerank.bin"
+AUTHORITY_FILE_NAME = "authority.bin"
+
+# a document's relevance score is BETA * cosine_sim(q, d) + ALPHA * PageRank + GAMMA * authority
+ALPHA = 1.5 # tuning factor for computing relevance scores
+BETA = 2.5 # tuning factor for computing relevance scores
+GAMMA = 1.5 # tuning factor for computing relevance scores (global HITS authority)
+
+# how much an occurrence of a term in each field counts for, relative to one in the body.
+# applied when the weights are computed (see impacts.py), so these can be tuned without rebuilding the index
+FIELD_WEIGHTS = {'title': 10, 'bold': 2, 'h1': 7, 'h2': 6, 'h3': 5, 'h4': 4, 'h5': 3}
+_FIELD_BOOSTS = [FIELD_WEIGHTS[field] - 1 for field in FIELDS] # every occurrence already counts once in tf
+
+
+def weighted_tf(posting) -> float:
+    """the term frequency of a posting with its field occurrences weighted by FIELD_WEIGHTS"""
+    tf = posting.term_frequency
+    if posting.field_frequencies:
+        for boost, frequency in zip(_FIELD_BOOSTS, posting.field_frequencies):
+            tf += boost * frequency
+    return tf
+
+
+def _write_doubles(path:str, values) -> None:
+    """writes a binary array of doubles (indexed by docID)"""
+    with open(path, "wb") as f:
+        array('d', values).tofile(f)
+
+
+def _load_doubles(path:str) -> array:
+    values = array('d')
+    with open(path, "rb") as f:
+        values.frombytes(f.read())
+    return values
+
+
+def write_pagerank(ranks) -> None:
+    """writes the PageRank of every page (see pagerank.py)"""
+    _write_doubles(PAGERANK_FILE_NAME, ranks)
+
+
+def load_pagerank() -> array:
+    """loads the ranks written by write_pagerank"""
+    return _load_doubles(PAGERANK_FILE_NAME)
+
+
+def write_authorities(authorities) -> None:
+    """writes the HITS authority score of every page (see authoritator.py)"""
+    _write_doubles(AUTHORITY_FILE_NAME, authorities)
+
+
+def load_authorities() -> array:
+    """loads the scores written by write_authorities"""
+    return _load_doubles(AUTHORITY_FILE_NAME)
+
+
+def static_scores(page_ranks, authorities) -> array:
+    """the query independent part of every document's relevance score,
+    ALPHA * PageRank + GAMMA * authority (a missing score counts as 0)"""
+    return array('d', (ALPHA * page_rank + GAMMA * authority
+                       for page_rank, authority in zip_longest(page_ranks, authorities, fillvalue=0.0)))
+
 
+def idf(df:int, doc_count:int) -> float:
+    """the inverse document frequency of a term in df of doc_count documents, log10(N/df_t).
+    the one definition of it: it's computed once per term when the index is built and stored
+    in the lexicon, where both the document weights and the query weights get it from"""
+    return math.log10(doc_count / df)
 
 
-def compute_tf_idf(term:str, docID:int, index_of_index:dict, id_wordcount:dict) -> float:
-    """Computes the tf-idf score of a 
-    term against a given doc.
-    
+def compute_weight(tf:float, wordcount:int, idf:float) -> float:
+    """Computes the tf-idf weight of a
+    term in a document.
+
     The following heuristics will be used:
     1. term frequency for tf:
         tf_{t,d} / len(d)
-    2. idf = log(N/df_t)
+       where tf_{t,d} is field-weighted (see weighted_tf)
+    2. idf = log(N/df_t) (see idf, it's stored in the lexicon)
 
     the result will be tf * idf for term t againt document d
-    
+
     we'll define tf_{t,d} as the
     frequency of term t in d, and
     df_t as the # of documents that contain t
     (i.e. the length of its postings list)"""
-    # note: term is assumed to have a corresponding entry in index_of_index
-    file_seek = index_of_index[term]
-    postings:dict[int:int] = dict()
-    line = ""
-    posting_count = 0
-    with open("index.txt", "r") as f:
-        # extracts the postings list from the index.txt file
-        f.seek(file_seek)
-        line = f.readline()
-        line = line.split(" | ")
-        for posting in line[1:]:
-            if posting and posting != '\n':
-                posting = posting.split("|")
-                postings[int(posting[0])] = int(posting[1])
-                posting_count += 1
-    if docID not in postings: # if this term doesn't appear in document # docID, return 0
-        return 0
     try:
-        tf = postings[docID] / id_wordcount[docID]
+        tf = tf / wordcount
     except ZeroDivisionError: # if wordcount is 0, it contributes nothing
-        tf = postings[docID] / 999999
-    idf = math.log(55393 / posting_count, 10)
+        tf = tf / 999999
     return tf * idf
 
 
-def compute_cosine_sim(query:list[str], docID: int, docIDFs:dict, 
-        index_of_index:dict, tf_idf_scores:dict):
-    """computes cosine similarity between a query and a document
-    uses the formula provided in slides (lec 21)"""
+def write_doc_norms(norms:list[float]) -> None:
+    """writes the length of every document's tf-idf vector"""
+    _write_doubles(DOC_NORMS_FILE_NAME, norms)
+
+
+def load_doc_norms() -> array:
+    """loads the document norms written by write_doc_norms"""
+    return _load_doubles(DOC_NORMS_FILE_NAME)
+
+
+def query_weights(query:list[str], docIDFs:dict) -> dict[str:float]:
+    """the (unit length) tf-idf vector of a query, as term:weight.
+    a term's weight is its frequency in the query (over the query's length) times its idf"""
     query_count = dict()
     for word in query:
         if word in query_count:
             query_count[word] += 1
         else:
             query_count[word] = 1
-    numerator = 0
-    normalize_q = 0
-    normalize_d = 0
-    for word, count in query_count.items():
-        qi = ((count) / len(query)) * docIDFs[word]
-        try:
-            di = tf_idf_scores[(word, docID)]
-        except KeyError:
-            di = 0
-        numerator +=  qi * di
-        normalize_q += qi ** 2
-        normalize_d += di ** 2
-    try:
-        return numerator / (math.sqrt(normalize_q) * math.sqrt(normalize_d))
-    except ZeroDivisionError: # if query and doc have zero terms in common, 0 is returned
-        return 0 
-    
+    weights = {word: (count / len(query)) * docIDFs[word] for word, count in query_count.items()}
+    normalize_q = math.sqrt(sum(qi ** 2 for qi in weights.values()))
+    return {word: qi / normalize_q for word, qi in weights.items() if qi}
+
+
+def wand_top_k(query:dict[str:float], index, doc_norms:array, k:int, static_scores:array,
+        beta:float=1.0, champions:bool=False, static_bound:float | None=None) -> list[tuple[float, int]]:
+    """
+    Finds the k documents with the highest
+        beta * cosine_sim(q, d) + static_scores[d]
+    among the documents sharing a term with the query (formula from slides, lec 21),
+    document at a time with WAND dynamic pruning.
+
+    the cosine similarity is the sum over the query's terms of q_t * w_{t,d} / |d|, so with
+    every term's max impact (the largest w_{t,d} / |d| in its postings, stored in the lexicon)
+    and the largest static score, it's cheap to bound how much any document can score.
+    the term cursors are kept sorted by their current docID; the pivot is the first docID at
+    which the bounds of the terms up to it could beat the current k-th best score. every
+    document before the pivot can't make it, so the cursors behind it seek straight past them
+    (which for a common term means skipping most of its postings) and only documents
+    that could enter the top k get scored.
+    with champions set, only the terms' champion lists are walked (see impacts.py), which
+    is much faster for common terms but only approximate.
+    static_bound is the largest static score, which callers should compute once
+    rather than have every query scan static_scores for it.
+    returns (score, docID) of the top k documents, best first
+    """
+    cursors = []
+    for word, qi in query.items():
+        cursor = index.champion_cursor(word) if champions else index.cursor(word)
+        cursor.bound = beta * qi * index.max_impact(word)
+        cursor.qi = qi
+        cursors.append(cursor)
+    if static_bound is None:
+        static_bound = max(static_scores, default=0)
+    top = [] # min heap of the best (score, docID) so far
+    threshold = -math.inf # a document has to score more than this to make the top k
+    while True:
+        cursors = [cursor for cursor in cursors if cursor.doc_id != END_OF_POSTINGS]
+        cursors.sort(key=lambda cursor: cursor.doc_id)
+        bound = static_bound
+        pivot = None
+        for i, cursor in enumerate(cursors):
+            bound += cursor.bound
+            if bound > threshold:
+                pivot = i
+                break
+        if pivot is None: # nothing left can make the top k
+            break
+        pivot_doc = cursors[pivot].doc_id
+        if cursors[0].doc_id == pivot_doc: # every cursor up to the pivot is on it: score it
+            cosine_sim = 0.0
+            for cursor in cursors:
+                if cursor.doc_id != pivot_doc:
+                    break
+                cosine_sim += cursor.qi * cursor.weight
+                cursor.next()
+            if cosine_sim and doc_norms[pivot_doc]:
+                score = beta * cosine_sim / doc_norms[pivot_doc] + static_scores[pivot_doc]
+                if len(top) < k:
+                    heapq.heappush(top, (score, pivot_doc))
+                elif score > top[0][0]:
+                    heapq.heapreplace(top, (score, pivot_doc))
+                if len(top) == k:
+                    threshold = top[0][0]
+        else:
+            for cursor in cursors[:pivot]:
+                cursor.seek(pivot_doc)
+    return sorted(top, reverse=True)
+
 
+def _has_phrase(phrase_positions:list[tuple[int, list[int]]]) -> bool:
+    """whether the terms of a phrase occur in order, given each term's offset
+    in the phrase and its positions in a document"""
+    (first_offset, first_positions), rest = phrase_positions[0], phrase_positions[1:]
+    rest = [(offset - first_offset, set(positions)) for offset, positions in rest]
+    return any(all(start + offset in positions for offset, positions in rest) for start in first_positions)
 
 
+def _min_window(position_lists:list[list[int]]) -> int:
+    """the length of the shortest span of a document containing a position from every list"""
+    heap = [(positions[0], i, 0) for i, positions in enumerate(position_lists)]
+    heapq.heapify(heap)
+    end = max(position for position, _, _ in heap)
+    shortest = math.inf
+    while True:
+        start, i, j = heapq.heappop(heap)
+        shortest = min(shortest, end - start + 1)
+        if j + 1 == len(position_lists[i]):
+            return shortest
+        heapq.heappush(heap, (position_lists[i][j + 1], i, j + 1))
+        end = max(end, position_lists[i][j + 1])
+
+
+def conjunctive_top_k(query:dict[str:float], index, doc_norms:array, k:int, static_scores:array,
+        beta:float=1.0, required:list[str] | None=None, phrases:list[list[tuple[str, int]]]=()) -> list[tuple[float, int]]:
+    """
+    Like wand_top_k, but only documents containing every term of required (by default,
+    every term of the query: an AND query) and every one of the phrases are ranked.
+    a phrase is given as (term, offset in the phrase) pairs; its terms are always required
+    (even those query_weights left out of the query, for being in every document).
+    the documents are found by intersecting the required terms' postings lists (see postings.intersect),
+    which skips through the longer lists, so it costs about as much as the rarest term's list.
+    positions are only decoded for the phrase terms, and only for documents in that intersection.
+    returns (score, docID) of the top k documents, best first
+    """
+    phrase_words = {word for phrase in phrases for word, _ in phrase}
+    required = {word: index.cursor(word) for word in [*(query if required is None else required), *phrase_words]}
+    optional = {word: index.cursor(word) for word in query if word not in required}
+    readers = {word: (index.cursor(word), index.positions(word)) for word in phrase_words}
+    top = []
+    for docID in intersect(list(required.values())):
+        if phrases:
+            positions = dict()
+            for word, (cursor, reader) in readers.items():
+                cursor.seek(docID) # a required term, so it's in the document
+                positions[word] = reader.positions(cursor.posting_number)
+            if not all(_has_phrase([(offset, positions[word]) for word, offset in phrase]) for phrase in phrases):
+                continue
+        cosine_sim = sum(query.get(word, 0) * cursor.weight for word, cursor in required.items())
+        for word, cursor in optional.items():
+            if cursor.seek(docID) == docID:
+                cosine_sim += query[word] * cursor.weight
+        score = static_scores[docID]
+        if doc_norms[docID]:
+            score += beta * cosine_sim / doc_norms[docID]
+        if len(top) < k:
+            heapq.heappush(top, (score, docID))
+        elif score > top[0][0]:
+            heapq.heapreplace(top, (score, docID))
+    return sorted(top, reverse=True)
+
+
+def proximity_rerank(top:list[tuple[float, int]], query:list[str], index, weight:float) -> list[tuple[float, int]]:
+    """
+    Boosts the score of every result by how close together the query's terms occur in it:
+    weight * (number of the query's terms it has) / (length of the shortest span containing all of them),
+    i.e. weight for a page where they're all right next to each other.
+    only the results' positions are decoded (in docID order, so each list is read once).
+    returns the results re-sorted by their new scores, best first
+    """
+    words = list(dict.fromkeys(query))
+    if len(words) < 2:
+        return top
+    cursors = {word: index.cursor(word) for word in words}
+    readers = {word: index.positions(word) for word in words}
+    boosts = dict()
+    for docID in sorted(docID for _, docID in top):
+        position_lists = []
+        for word, cursor in cursors.items():
+            if cursor.seek(docID) == docID:
+                position_lists.append(readers[word].positions(cursor.posting_number))
+        if len(position_lists) >= 2:
+            boosts[docID] = weight * len(position_lists) / _min_window(position_lists)
+    return sorted(((score + boosts.get(docID, 0), docID) for score, docID in top), reverse=True)
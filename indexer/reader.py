@@ -1,13 +1,16 @@
 from typing import Dict
+import re
 from bs4 import BeautifulSoup as BS
 from urllib.parse import urlparse, urlunparse, urldefrag, urljoin
-import shelve
-import os
 
 class Document:
     _docID = 0 # initalizes a document ID (Serial #) for every document
 
 
+# the fields a term occurrence can be in; field i is bit (1 << i) of a field mask
+FIELDS = ('title', 'bold', 'h1', 'h2', 'h3', 'h4', 'h5')
+
+
 class Posting:
     """A class to represent a Posting.
     
@@ -15,12 +18,14 @@ class Posting:
         document_id: the ID of the document this Posting is for
         term_frequency: the frequency of the Term in the document with id document_id
         position: postional datat of the term in the document (TBD)
+        field_frequencies: how many of those occurrences are in each of FIELDS
+            (None if the term never appears in a field)
     """
-    def __init__(self, document_id:int, term_frequency:int, positions:list):
+    def __init__(self, document_id:int, term_frequency:int, positions:list, field_frequencies:list=None):
         self.document_id = document_id
         self.term_frequency = term_frequency
         self.positions = positions
-        # anything else?
+        self.field_frequencies = field_frequencies
     
     def __lt__(self, other):
         # Only works with another Posting instance.
@@ -30,11 +35,14 @@ class Posting:
 
 
     def __repr__(self):
-        return f"Posting(document_id={self.document_id}, term_frequency={self.term_frequency}, positions={self.positions})"
+        return f"Posting(document_id={self.document_id}, term_frequency={self.term_frequency}, positions={self.positions}, field_frequencies={self.field_frequencies})"
 
 
 # TOKEN FILE PARSING
 
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+")
+BYTES_TOKEN_PATTERN = re.compile(rb"[A-Za-z0-9]+")
+
 def tokenize(file_path: str) -> list[str]:
     """
     Given a text file path, lex the contents
@@ -43,36 +51,12 @@ def tokenize(file_path: str) -> list[str]:
     Runtime:
         O(n) with n being the size of the file in bytes
     Justification:
-        We are iterating through the contents of the file 100 bytes at a time,
-        processing the data as we go.
+        The whole file is read once and handed to tokenize_text.
     """
-    # List of alphanumeric strings
-    tokens = []
-
     try:
         # Open the file in read mode with UTF-8 encoding to prevent text data corruption
         with open(file_path, 'r', encoding='UTF-8', errors='ignore') as file:
-            # Read the first 100 bytes from the file
-            buffer = file.read(100)
-
-            # Builder string to keep track of the alphanumeric sequence of characters
-            builder = ""
-
-            # Loop until the buffer string is empty
-            while len(buffer) != 0:
-                # Check if each character is alphanumeric
-                for char in buffer:
-                    if is_alnum(char): # if character is alphanumeric
-                        builder += char # append the character into the builder
-                    else: # if character is NOT alphanumeric and the builder string is NOT empty
-                        if builder.strip():
-                            tokens.append(builder.strip().lower()) # add the builder string into the list of tokens
-                        builder = "" # flush the builder string
-                buffer = file.read(100) # read the next 100 bytes
-
-            # If we hit EOF, there may be data in the builder string
-            if len(builder) != 0: # if so
-                tokens.append(builder) # add builder string into list of tokens
+            return tokenize_text(file.read())
     except FileNotFoundError: # handling nonexistent files
         print(f'File does not exist!')
         return []
@@ -80,7 +64,41 @@ def tokenize(file_path: str) -> list[str]:
         print(f'Something went wrong: {e}')
         return []
 
-    return tokens
+
+def iter_tokens(text: str | bytes):
+    """
+    Given a string (or a bytes buffer of UTF-8 text),
+    yield its lowercased alphanumeric tokens in order
+
+    Runtime:
+        O(n) with n being the length of the text
+    Justification:
+        A single regex scan over the text; matching and lowercasing happen in C.
+        A token is a maximal run of ASCII letters and digits, exactly like the
+        character-by-character lexing tokenize used to do (non-ASCII characters,
+        including UTF-8 continuation bytes, are separators).
+    """
+    if isinstance(text, str):
+        for match in TOKEN_PATTERN.finditer(text):
+            yield match.group().lower()
+    else:
+        for match in BYTES_TOKEN_PATTERN.finditer(text):
+            yield match.group().lower().decode('ascii')
+
+
+def tokenize_text(text: str | bytes) -> list[str]:
+    """
+    Given a string (or a bytes buffer of UTF-8 text),
+    return a list of its lowercased alphanumeric tokens
+
+    Runtime:
+        O(n) with n being the length of the text
+    Justification:
+        See iter_tokens.
+    """
+    if isinstance(text, str):
+        return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+    return [token.lower().decode('ascii') for token in BYTES_TOKEN_PATTERN.findall(text)]
 
 
 def is_alnum(char: str) -> bool:
@@ -122,9 +140,11 @@ def compute_word_frequencies(tokens: list[str]) -> Dict[str, int]:
 
     return frequencies
 
-def post_tokens(doc_id: int, tokens: list) -> dict:
+def post_tokens(doc_id: int, tokens: list, field_masks: list = None) -> dict:
     """creates Postings for each (unqiue) term found in a page's content.
     The raw list of tokens is used to discover the positions of each token in the page.
+    field_masks (if given) holds the field mask of each token, which is tallied into
+    the Postings' field frequencies.
     Returns a mapping between tokens and Postings.
     """
     postings = dict()
@@ -134,6 +154,13 @@ def post_tokens(doc_id: int, tokens: list) -> dict:
         else:
             postings[token] = Posting(doc_id, 1, list())
         postings[token].positions.append(index)
+        if field_masks and field_masks[index]:
+            posting = postings[token]
+            if posting.field_frequencies is None:
+                posting.field_frequencies = [0] * len(FIELDS)
+            for field in range(len(FIELDS)):
+                if field_masks[index] >> field & 1:
+                    posting.field_frequencies[field] += 1
     return postings
 
 
@@ -155,60 +182,3 @@ def absolutize(doc_url: str, url: str) -> str:
     else:
         absolute_url = url
     return absolute_url
-
-
-
-# MERGING INVERTED INDEX AND OUTGOING URL INDEX
-
-FILE_NAME = "OMEGA_INDEX"
-
-def merge_partial_indexes() -> None:
-    """
-    Merges the partial indexes into one big index.
-    """
-    if (os.path.exists(FILE_NAME)):
-        os.remove(FILE_NAME)
-    with shelve.open(FILE_NAME, writeback=True) as omega:
-        for i in range(1, 14):
-            with open("merge-log.txt", "a") as f:
-                f.write(f"Now merging: {i}\n")
-            with shelve.open(f"partials/{FILE_NAME}-{i}", writeback=True) as partial:
-                for token in partial.keys():
-                    if token in omega:
-                        omega[token] += partial[token]
-                    else:
-                        omega[token] = partial[token]
-        with open("merge-log.txt", "a") as f:
-            f.write("Finished merging partial inverted indices!\n")
-
-def merge_outgoing() -> None:
-    with open("merge-log.txt", "a") as f:
-        f.write(f"Now merging document outgoing links...\n")
-    with shelve.open("OMEGA_OUTGOING", writeback=True) as omega:
-        for i in range(1, 14):
-            with open("merge-log.txt", "a") as f:
-                f.write(f"Now merging: {i}\n")
-            with shelve.open(f"outgoings/OUTGOING_LINKS-{i}", writeback=True) as partial:
-                for doc in partial.keys():
-                    print(doc)
-                    omega[doc] = partial[doc]
-        with open("merge-log.txt", "a") as f:
-            f.write("Finished merging partial outgoing links shelves!\n")
-        
-
-def generate_report() -> None:
-    with open("m1_report.txt", "w") as report:
-        if (os.path.exists(FILE_NAME)):
-            report.write(f"Number of documents: {55393}\n") # info from structurer.py
-            report.write(f"Shelve size: {os.path.getsize(FILE_NAME) / 1024} KB\n")            
-            with shelve.open(f"{FILE_NAME}") as omega:
-                report.write(f"Number of unique tokens: {len(omega)}\n")
-                for token in omega.keys():
-                    report.write(f"{token} | {(', ').join([str(posting.document_id) for posting in omega[token]])}\n")
-        else:
-            raise FileNotFoundError("No OMEGA_INDEX!")
-
-if __name__ == '__main__':
-    merge_partial_indexes()
-    # merge_outgoing()
-    generate_report()
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""Serves the search engine over HTTP, so the index is loaded once rather than per session.
+
+    GET  /search?q=<query>[&k=<number of results>]
+    POST /search    with a JSON body of {"query": <query>, "k": <number of results>}
+    GET  /stats
+
+all of which answer in JSON. Connections are handled concurrently with asyncio (and kept
+alive between requests), while the queries themselves run one at a time on a worker
+thread, so a slow query never holds up the event loop (or /stats).
+
+Run it from the directory holding the index:
+    python3 indexer/server.py [port, or the path of a unix socket to listen on]
+"""
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from boolean import SearchEngine, K
+
+HOST = "127.0.0.1"
+PORT = 8080
+MAX_K = 1000 # most results a request can ask for
+MAX_BODY_SIZE = 64 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class BadRequest(Exception):
+    def __init__(self, status:int, message:str):
+        super().__init__(message)
+        self.status = status
+
+
+class SearchServer:
+    """Answers requests with a SearchEngine, keeping count of what it's served for /stats"""
+    def __init__(self, engine:SearchEngine):
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(max_workers=1) # the engine isn't thread safe, so queries take turns
+        self.start_time = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.searches = 0
+        self.search_ms = 0.0
+        self.in_flight = 0
+
+    async def search(self, query, k) -> dict:
+        if not isinstance(query, str) or not query.strip():
+            raise BadRequest(400, "a non-empty query is required")
+        try:
+            k = int(k)
+        except (TypeError, ValueError):
+            raise BadRequest(400, "k must be an integer")
+        if not 0 < k <= MAX_K:
+            raise BadRequest(400, f"k must be between 1 and {MAX_K}")
+        self.in_flight += 1
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(self.executor, self.engine.search, query, k)
+        finally:
+            self.in_flight -= 1
+        self.searches += 1
+        self.search_ms += response["runtime_ms"]
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "uptime_s": time.time() - self.start_time,
+            "requests": self.requests,
+            "errors": self.errors,
+            "searches": self.searches,
+            "in_flight": self.in_flight,
+            "average_search_ms": self.search_ms / self.searches if self.searches else 0.0,
+            "engine": self.engine.stats(),
+        }
+
+    async def route(self, method:str, target:str, body:bytes) -> dict:
+        url = urlsplit(target)
+        if url.path == "/stats":
+            if method != "GET":
+                raise BadRequest(405, "use GET")
+            return self.stats()
+        if url.path == "/search":
+            if method == "GET":
+                params = parse_qs(url.query)
+                return await self.search(params.get("q", [""])[0], params.get("k", [K])[0])
+            if method == "POST":
+                try:
+                    request = json.loads(body)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    raise BadRequest(400, "the body must be JSON")
+                if not isinstance(request, dict):
+                    raise BadRequest(400, "the body must be a JSON object")
+                return await self.search(request.get("query"), request.get("k", K))
+            raise BadRequest(405, "use GET or POST")
+        raise BadRequest(404, f"no such endpoint: {url.path}")
+
+    async def handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        """serves every request made over one connection"""
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError): # longer than the stream's limit
+                    await self.respond(writer, 400, {"error": "request line too long"}, keep_alive=False)
+                    break
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+                headers = dict()
+                try:
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self.respond(writer, 400, {"error": "header line too long"}, keep_alive=False)
+                    break
+                keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+                self.requests += 1
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    self.errors += 1
+                    await self.respond(writer, 400, {"error": "bad content-length"}, keep_alive=False)
+                    break
+                if length > MAX_BODY_SIZE: # the body's left unread, so the connection can't be reused
+                    self.errors += 1
+                    await self.respond(writer, 413, {"error": f"bodies are limited to {MAX_BODY_SIZE} bytes"},
+                                       keep_alive=False)
+                    break
+                try:
+                    body = await reader.readexactly(length) if length else b""
+                    status, response = 200, await self.route(method, target, body)
+                except BadRequest as e:
+                    self.errors += 1
+                    status, response = e.status, {"error": str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    raise
+                except Exception as e:
+                    self.errors += 1
+                    print(f"error answering {method} {target}: {e!r}")
+                    status, response = 500, {"error": "internal server error"}
+                await self.respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass # the client went away
+        finally:
+            writer.close()
+
+    async def respond(self, writer:asyncio.StreamWriter, status:int, response:dict, keep_alive:bool) -> None:
+        body = json.dumps(response).encode("UTF-8")
+        writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                      f"Content-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(server:SearchServer, address:str | int) -> None:
+    if isinstance(address, int):
+        listener = await asyncio.start_server(server.handle, HOST, address)
+        print(f"Serving on http://{HOST}:{address}")
+    else:
+        listener = await asyncio.start_unix_server(server.handle, address)
+        print(f"Serving on unix socket {address}")
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == '__main__':
+    address = sys.argv[1] if len(sys.argv) > 1 else PORT
+    if isinstance(address, str) and address.isdigit():
+        address = int(address)
+    start_time = time.time()
+    search_server = SearchServer(SearchEngine()) # everything gets loaded here, once
+    print("--- loaded in %s seconds ---" % (time.time() - start_time))
+    asyncio.run(serve(search_server, address))
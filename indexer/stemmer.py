@@ -0,0 +1,49 @@
+"""Porter stemming with a bounded LRU cache in front of nltk.
+
+Word frequencies are Zipfian, so almost every stem call is for a word that has
+been stemmed before. The cache can be saved to and loaded from disk so that an
+index rebuild (or an engine start) begins warm."""
+import os
+from cache import LRUCache
+from nltk.stem import PorterStemmer as PS
+
+STEM_CACHE_FILE_NAME = "stem_cache.txt"
+STEM_CACHE_SIZE = 200_000
+
+
+class CachedStemmer:
+    """Drop-in replacement for PorterStemmer.stem backed by an LRUCache"""
+    def __init__(self, maxsize:int=STEM_CACHE_SIZE):
+        self.stemmer = PS()
+        self.cache = LRUCache(maxsize)
+
+    def stem(self, word:str) -> str:
+        """stems a word, only calling into nltk on a cache miss"""
+        stemmed = self.cache.get(word)
+        if stemmed is None:
+            stemmed = self.stemmer.stem(word)
+            self.cache.put(word, stemmed)
+        return stemmed
+
+    def save(self, path:str=STEM_CACHE_FILE_NAME) -> None:
+        """writes the cache to a text file of "word stem" lines,
+        least recently used first so that loading it back keeps the recency order"""
+        with open(path, "w") as f:
+            for word, stemmed in self.cache.items():
+                f.write(f"{word} {stemmed}\n")
+
+    def load(self, path:str=STEM_CACHE_FILE_NAME) -> None:
+        """warms the cache from a file written by save (does nothing if it doesn't exist)"""
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            line = f.readline()
+            while line:
+                line = line.split()
+                if len(line) == 2:
+                    self.cache.put(line[0], line[1])
+                line = f.readline()
+
+    def stats(self) -> dict:
+        """hit-rate stats of the underlying cache"""
+        return self.cache.stats()
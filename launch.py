@@ -4,16 +4,18 @@ from argparse import ArgumentParser
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.worker import Worker
+from crawler.async_worker import AsyncWorker
 import global_cache as gc
 import report as r
 
 
-def main(config_file, restart):
+def main(config_file, restart, async_crawl=False):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
     config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    crawler = Crawler(config, restart, worker_factory=AsyncWorker if async_crawl else Worker)
     gc.unshelve_globals()
     try:
         crawler.start()
@@ -22,6 +24,7 @@ def main(config_file, restart):
     except Exception as e:
         with open("bad_error.txt", "w") as bad_error_file:
             bad_error_file.write(f"Something bad happened :(\n\n{e}")
+    crawler.frontier.close()
     r.write_report()
 
 
@@ -29,6 +32,7 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--async_crawl", action="store_true", default=False)
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    main(args.config_file, args.restart, args.async_crawl)
 
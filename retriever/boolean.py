@@ -2,24 +2,30 @@
 import shelve
 import indexer.reader
 import json 
+from bisect import bisect_left
 
 ID_TO_FILE = dict()
 
 
 def doc_intersection(list1:int, list2:int) -> list:
-    """Computes the intersection of two lists
-    of document IDs
+    """Computes the intersection of two sorted lists
+    of document IDs, walking the shorter one and galloping
+    through the longer one to find each of its IDs
     """
+    if len(list1) > len(list2):
+        list1, list2 = list2, list1
     res = [] # init empty list
-    while list1 and list2: # iterate through both lists, building res if an element is shared between them
-        if list1[0] == list2[0]:
-            res.append(list1[0])
-            list1.pop(0)
-            list2.pop(0)
-        elif list1[0] < list2[0]:
-            list1.pop(0)
-        else:
-            list2.pop(0)
+    i = 0 # position in list2
+    for doc_id in list1: # for every element of the shorter list, look for it in the longer one
+        step = 1
+        while i + step < len(list2) and list2[i + step] < doc_id: # gallop ahead to bracket doc_id
+            i += step
+            step *= 2
+        i = bisect_left(list2, doc_id, i, min(i + step + 1, len(list2)))
+        if i == len(list2):
+            break
+        if list2[i] == doc_id:
+            res.append(doc_id)
     return res # return the list of shared elements
 
 
@@ -43,7 +49,7 @@ def run_engine() -> None:
             print("No results found!!!!")
             continue # reloop
         
-        postings.sort() # sort list of list of postings by length
+        postings.sort(key=len) # sort list of list of postings by length
 
         if len(postings) == 0: #if no results found
             print("No results found!")
@@ -0,0 +1,115 @@
+import re
+import time
+from urllib.parse import urlparse, unquote
+
+ROBOTS_TTL = 24 * 60 * 60 # seconds before a host's robots.txt gets fetched again
+RULE = None # key of a trie node that ends an Allow/Disallow path (its value is whether it allows)
+
+class RobotsRules(object):
+    """
+    The rules a robots.txt has for every user agent (*), compiled once so checking a URL
+    doesn't mean parsing the file again.
+
+    The Allow/Disallow paths are kept in a character trie, so checking a URL walks its
+    path once, whatever the size of the robots.txt. Paths with wildcards (* or an ending $)
+    are compiled to regexes instead. As in RFC 9309, the longest matching rule decides
+    (Allow winning a tie) and a URL no rule matches is allowed.
+    """
+    def __init__(self, lines: list[str]):
+        self.trie = dict()
+        self.wildcards = list() # (length, allow, regex) of the rules with wildcards
+        self.crawl_delay = None
+        self.sitemaps = list()
+        self.fetched_at = time.time()
+        applies = False # whether the current group is for every user agent
+        in_rules = False # whether the current group's user-agent lines are over
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            if ':' not in line: continue
+            key, value = line.split(':', 1)
+            key = key.strip().lower()
+            value = value.strip()
+            if key == 'user-agent':
+                if in_rules: # a user-agent line after rules starts a new group
+                    applies = in_rules = False
+                applies = applies or value == '*'
+            elif key in {'allow', 'disallow'}:
+                in_rules = True
+                if applies and value: # an empty Disallow disallows nothing
+                    self._add_rule(unquote(value), key == 'allow')
+            elif key == 'crawl-delay':
+                in_rules = True
+                if applies:
+                    try:
+                        self.crawl_delay = float(value)
+                    except ValueError:
+                        pass
+            elif key == 'sitemap':
+                self.sitemaps.append(value)
+
+    def _add_rule(self, path: str, allow: bool) -> None:
+        if '*' in path or path.endswith('$'):
+            anchored = path.endswith('$')
+            pattern = ''.join('.*' if char == '*' else re.escape(char) for char in path.rstrip('$'))
+            self.wildcards.append((len(path), allow, re.compile(pattern + ('$' if anchored else ''))))
+            return
+        node = self.trie
+        for char in path:
+            node = node.setdefault(char, dict())
+        node[RULE] = node.get(RULE, False) or allow
+
+    def can_fetch(self, url: str) -> bool:
+        """whether the robots.txt lets every user agent fetch a url"""
+        parsed = urlparse(url)
+        path = unquote(parsed.path or '/') + ('?' + unquote(parsed.query) if parsed.query else '')
+        if path == '/robots.txt': return True
+        longest, allowed = 0, True
+        node = self.trie
+        for depth, char in enumerate(path, 1):
+            node = node.get(char)
+            if node is None: break
+            if RULE in node:
+                longest, allowed = depth, node[RULE]
+        for length, allow, regex in self.wildcards:
+            if (length > longest or (length == longest and allow)) and regex.match(path):
+                longest, allowed = length, allow
+        return allowed
+
+class RobotsCache(object):
+    """
+    The compiled RobotsRules of every host (scheme + netloc) whose robots.txt has been read.
+    Lookups take no lock: a host's entry is only ever replaced whole, never changed in place.
+    """
+    def __init__(self, ttl: float = ROBOTS_TTL):
+        self.ttl = ttl
+        self.rules = dict()
+
+    def update(self, host: str, lines: list[str]) -> RobotsRules:
+        """compiles a host's (newly fetched) robots.txt"""
+        rules = RobotsRules(lines)
+        self.rules[host] = rules
+        return rules
+
+    def can_fetch(self, url: str) -> bool:
+        """whether a url is allowed by its host's robots.txt (it is if that hasn't been read)"""
+        rules = self.rules.get(urlparse(url)._replace(path='', params='', query='', fragment='').geturl())
+        return rules is None or rules.can_fetch(url)
+
+    def crawl_delay(self, host: str) -> float | None:
+        rules = self.rules.get(host)
+        return rules.crawl_delay if rules else None
+
+    def is_stale(self, host: str) -> bool:
+        """whether a host's robots.txt was read more than ttl seconds ago"""
+        rules = self.rules.get(host)
+        return rules is not None and time.time() - rules.fetched_at > self.ttl
+
+    def mark_refreshing(self, host: str) -> None:
+        """restarts a host's ttl as its robots.txt is fetched again, so it's only
+        fetched once (and the rules it has are kept if that fetch fails)"""
+        rules = self.rules.get(host)
+        if rules is not None:
+            rules.fetched_at = time.time()
+
+    def __contains__(self, host: str) -> bool:
+        return host in self.rules
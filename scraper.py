@@ -1,13 +1,12 @@
 import re
-from crawler import frontier
 from urllib.parse import urlparse, urljoin, urldefrag
-from urllib.robotparser import RobotFileParser as RFP
+from robots import RobotsCache
 import ssl
 from bs4 import BeautifulSoup
 from utils import normalize
-from assignment1 import tokenize, compute_word_frequencies
+from assignment1 import compute_word_frequencies
+from indexer.reader import tokenize_text
 from report import stopwords
-from os import remove
 from simhash import *
 from threading import Thread, Lock
 from assignment1 import is_alnum
@@ -17,7 +16,6 @@ largest_word_count_lock = Lock()
 words_frequencies_lock = Lock()
 seen_domains_lock = Lock()
 forbidden_crawls_lock = Lock()
-robots_data_lock = Lock()
 ics_subdomains_lock = Lock()
 fingerprints_lock = Lock()
 
@@ -26,11 +24,11 @@ largest_word_count = 0 # variable tracking the highest word count seen in a page
 words_frequencies = dict() # dictionary mapping words to their frequencies across all pages
 seen_domains = set() # a set that holds domains seen after reading its robots.txt
 forbidden_crawls = set() # a set to hold all links whihc have been listed as disallow in robots.txt
-robots_data = dict() # a dict mapping a domain to its robots.txt text content
+robots_cache = RobotsCache() # the compiled robots.txt rules of every domain (the frontier reads their Crawl-delay)
 ics_subdomains = dict() # a dict mapping an ics sub domain to its unique page count
 fingerprints = dict() # a dict that maps all fingerprints of downloaded webpages to their urls
 
-def scraper(url, resp, worker_id):
+def scraper(url, resp, worker_id, parsed=None):
     #TODO: sets to keep track of domains
     #TODO: inspect the domain's robots.txt (if not seen before) and verify are we actually allowed to crawl?
     # also grab sitemaps while at it
@@ -59,7 +57,7 @@ def scraper(url, resp, worker_id):
     # TODO: inserts inspecttion of the robots.txt here
 
     # parse the content
-    links = extract_next_links(url, resp, worker_id)
+    links = extract_next_links(url, resp, worker_id, parsed)
     return [link for link in links if is_valid(link)]
 
 def _can_we_crawl_here_domain(resp) -> list[str] | None:
@@ -74,27 +72,19 @@ def _can_we_crawl_here_domain(resp) -> list[str] | None:
     # Parse URL
     domain = urlparse(resp.url)._replace(path='', params='', query='', fragment='')
 
-    # Initialize robot file parser
-    robots_parser = RFP()
-    robots_parser.set_url(domain.geturl() + '/robots.txt')
-
-    # Set the link to the domain's robots.txt
-    robots_parser.parse(resp.raw_response.content.decode(errors='ignore').splitlines()) # feeds the robots.txt to the parser
-
-    # Save the robots.txt content for the domain in global robots_data
+    # Compile the domain's robots.txt (replacing the rules it had, if this is a refresh)
     # TODO: what if there is no robots.txt
-    with robots_data_lock:
-        robots_data[domain.geturl()] = resp.raw_response.content.decode(errors='ignore').splitlines()
+    robots_rules = robots_cache.update(domain.geturl(), resp.raw_response.content.decode(errors='ignore').splitlines())
 
-    if not robots_parser.can_fetch('*', domain.geturl()): # is this domain forbidden by robots.txt?
+    if not robots_rules.can_fetch(domain.geturl()): # is this domain forbidden by robots.txt?
         with forbidden_crawls_lock:
             forbidden_crawls.add(domain.geturl()) # add to global var tracking forbidden urls
         with open("error.txt", "a") as f:
             f.write(f"{resp.url} is banned from crawling\n")
         return None
     res = [domain.geturl()]
-    sitemaps = robots_parser.site_maps() 
-    if sitemaps is not None:
+    sitemaps = robots_rules.sitemaps
+    if sitemaps:
         res.extend(sitemaps)
     else:
         res.append(domain.geturl() + '/sitemap.xml')
@@ -113,13 +103,7 @@ def _can_we_crawl_here_domain(resp) -> list[str] | None:
 def _is_url_banned(resp) -> bool:
     """checks if a specifc url is cleared for crawling, based
     off its domain's robots.txt content"""
-    domain = urlparse(resp.url)._replace(path='', params='', query='', fragment='')
-    robots_parser = RFP()
-    robots_parser.set_url(domain.geturl() + '/robots.txt')
-    # sets the parser to the domain's robots.txt file
-    with robots_data_lock:
-        robots_parser.parse(robots_data[domain.geturl()]) # feeds the robots.txt of the domain to the parser
-    return robots_parser.can_fetch('*', normalize(resp.url)) # is this url forbidden by its domain's robots.txt?
+    return robots_cache.can_fetch(normalize(resp.url)) # is this url forbidden by its domain's robots.txt?
 
 def _is_domain_checked(resp) -> bool:
     """A preliminary function that verifies that the url's domain has been
@@ -129,7 +113,55 @@ def _is_domain_checked(resp) -> bool:
     with seen_domains_lock:
         return domain.geturl() in seen_domains # only true once its robots.txt has been searched
 
-def extract_next_links(url, resp, worker_id):
+def parse_page(url, content) -> tuple[list[str], int, dict, str]:
+    """The CPU heavy part of scraping a page, which touches none of the globals
+    (so it can run in another process, see crawler/async_worker.py).
+    Returns the page's links (from loc and anchor tags), its word count,
+    the frequencies of its relevant words and its fingerprint"""
+    links = list()
+
+    # Soup up raw response
+    soup = BeautifulSoup(content, 'lxml')
+
+    for sm_url in soup.find_all('loc'): # gets all links hidden in loc tags in HTML (for sitemaps)
+        if sm_url.text not in {'#', '/'}: #does the loc url even exist, and if so, is it to a new link?
+            # # and / indicate the same page
+            url_scheme = urlparse(urldefrag(sm_url.text).url)._replace(query="")
+            # breaks a (defragmented) url into components to see if it's a relative or absolute
+            if not url_scheme.scheme or not url_scheme.netloc: # if scheme and netloc is None, it's a relative URL
+                url_result = urljoin(url, url_scheme.geturl())
+            else:
+                # otherwise, it is already absolute
+                url_result = url_scheme.geturl()
+            links.append(url_result)
+    for i in soup.find_all('a'): # gets all links hidden in anchor tags in HTML
+        href_url = i.get('href')
+        if href_url and href_url not in {'#', '/'}: #does the href url even exist, and if so, is it to a new link?
+            # # and / indicate the same page
+            url_scheme = urlparse(urldefrag(href_url).url)._replace(query="")
+            # breaks a (defragmented) url into components to see if it's a relative or absolute
+            if not url_scheme.scheme or not url_scheme.netloc: # if scheme and netloc is None, it's a relative URL
+                url_result = urljoin(url, url_scheme.geturl())
+            else:
+                # otherwise, it is already absolute
+                url_result = url_scheme.geturl()
+            links.append(url_result)
+
+    # Get tokens straight from the page's text (reusing the soup parsed above)
+    tokens = tokenize_text(soup.get_text())
+    word_count = len(tokens)
+    # Remove stopwords
+        # filter takes in a function and an iterable, returning an iterator
+    tokens = list(filter(is_relevent_word, tokens))
+
+    # Get the word frequencies in a dictionary
+    frequencies = compute_word_frequencies(tokens)
+
+    # Fingerprint the web content
+    fingerprint = get_fingerprint(frequencies)
+    return links, word_count, frequencies, fingerprint
+
+def extract_next_links(url, resp, worker_id, parsed=None):
     # Implementation required.
     # url: the URL that was used to get the page
     # resp.url: the actual url of the page
@@ -139,6 +171,7 @@ def extract_next_links(url, resp, worker_id):
     #         resp.raw_response.url: the url, again
     #         resp.raw_response.content: the content of the page!
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
+    # parsed: what parse_page returns for the page, if it's already been parsed
 
     # List to hold all valid links
     valid_links = list()
@@ -147,9 +180,6 @@ def extract_next_links(url, resp, worker_id):
     if not resp.raw_response:
         return list()
     
-    # Soup up raw response
-    soup = BeautifulSoup(resp.raw_response.content, 'lxml')
-
     # Import globals for use
     global largest_word_count, page_count
 
@@ -177,49 +207,14 @@ def extract_next_links(url, resp, worker_id):
                 f.write(f"{resp.url} is banned from crawling\n")
             return list()
         # otheriwse, we're clear for crawling.
-    for sm_url in soup.find_all('loc'): # gets all links hidden in loc tags in HTML (for sitemaps)
-        if sm_url.text not in {'#', '/'}: #does the loc url even exist, and if so, is it to a new link?
-            # # and / indicate the same page
-            url_scheme = urlparse(urldefrag(sm_url.text).url)._replace(query="")
-            # breaks a (defragmented) url into components to see if it's a relative or absolute
-            if not url_scheme.scheme or not url_scheme.netloc: # if scheme and netloc is None, it's a relative URL
-                url_result = urljoin(url, url_scheme.geturl())
-            else:
-                # otherwise, it is already absolute
-                url_result = url_scheme.geturl()
-            valid_links.append(url_result)
-    for i in soup.find_all('a'): # gets all links hidden in anchor tags in HTML
-        href_url = i.get('href')
-        if href_url and href_url not in {'#', '/'}: #does the href url even exist, and if so, is it to a new link?
-            # # and / indicate the same page
-            url_scheme = urlparse(urldefrag(href_url).url)._replace(query="")
-            # breaks a (defragmented) url into components to see if it's a relative or absolute
-            if not url_scheme.scheme or not url_scheme.netloc: # if scheme and netloc is None, it's a relative URL
-                url_result = urljoin(url, url_scheme.geturl())
-            else:
-                # otherwise, it is already absolute
-                url_result = url_scheme.geturl()
-            valid_links.append(url_result)
-    
-    # Store raw response into html.parser format for tokenizing
-    textsoup = BeautifulSoup(resp.raw_response.content, 'html.parser')
-    # Write raw content into temp file
-    with open(f"soup_text{worker_id}.txt", "w+") as soup_text_txt:
-        soup_text_txt.write(textsoup.get_text())
-    # Get tokens from temp file
-    tokens = tokenize(f"soup_text{worker_id}.txt")
+    if parsed is None:
+        parsed = parse_page(url, resp.raw_response.content)
+    links, word_count, frequencies, fingerprint = parsed
+    valid_links.extend(links)
+
     # Update largest word count if this is the biggest page so far
     with largest_word_count_lock:
-        if len(tokens) > largest_word_count: largest_word_count = len(tokens)
-    # Remove stopwords
-        # filter takes in a function and an iterable, returning an iterator
-    tokens = list(filter(is_relevent_word, tokens))
-
-    # Get the word frequencies in a dictionary
-    frequencies = compute_word_frequencies(tokens)
-
-    # Fingerprint the web content
-    fingerprint = get_fingerprint(frequencies)
+        if word_count > largest_word_count: largest_word_count = word_count
     # Return empty list if fingerprint is similar to saved fingerprints
     if not resp.raw_response.url.endswith('/robots.txt') and not resp.raw_response.url.endswith('.xml'):
         # Mutex for fingerprint set access
@@ -0,0 +1,54 @@
+"""Shared fixtures: a small random corpus, and an index built from it with the indexer's own code."""
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import indexer # the package, before indexer/indexer.py (found first once indexer/ is on the path) can shadow it
+# the indexer's modules import each other by name (they're run as scripts from indexer/)
+sys.path.insert(1, os.path.join(ROOT, "indexer"))
+
+import impacts
+import ranker
+import reader
+from postings import IndexWriter, IndexReader
+
+DOCUMENTS = 600
+VOCABULARY = [f"term{i}" for i in range(40)]
+
+
+def postings_of(documents:list[list[str]], field_masks:list[list[int]] | None=None) -> dict[str, list]:
+    """term -> postings list of a corpus given as the tokens of each document (its docID being its place)"""
+    postings = dict()
+    for doc_id, tokens in enumerate(documents):
+        page_postings = reader.post_tokens(doc_id, tokens, field_masks[doc_id] if field_masks else None)
+        for term, posting in page_postings.items():
+            postings.setdefault(term, []).append(posting)
+    return postings
+
+
+@pytest.fixture
+def corpus() -> list[list[str]]:
+    """the tokens of every document. the terms' frequencies fall off like Zipf's law, so a
+    few terms are in most documents (lists of several blocks) and the rest in a handful"""
+    rng = random.Random(0)
+    return [[VOCABULARY[min(int(rng.paretovariate(0.8)), len(VOCABULARY)) - 1] for _ in range(rng.randint(5, 60))]
+            for _ in range(DOCUMENTS)]
+
+
+@pytest.fixture
+def index(corpus, tmp_path, monkeypatch) -> IndexReader:
+    """the corpus indexed and weighted (see impacts.py) in a temporary directory, which the test runs in"""
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(1)
+    field_masks = [[rng.choice([0, 0, 0, 1, 1 << (len(reader.FIELDS) - 1), 5]) for _ in tokens] for tokens in corpus]
+    postings = postings_of(corpus, field_masks)
+    with IndexWriter() as writer:
+        for term in sorted(postings):
+            writer.add(term, postings[term], ranker.idf(len(postings[term]), len(corpus)))
+    impacts.compute_impacts({doc_id: len(tokens) for doc_id, tokens in enumerate(corpus)}, shard_count=2)
+    with IndexReader() as index:
+        yield index
@@ -0,0 +1,70 @@
+"""Cursors over postings lists (see indexer/postings.py), checked against plain sorted lists."""
+import random
+from bisect import bisect_left
+
+import pytest
+
+from postings import (PostingsCursor, BlockCursor, intersect, encode_postings, decode_skips, END_OF_POSTINGS,
+                      BLOCK_SIZE)
+from reader import Posting
+
+SIZES = [0, 1, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, 5 * BLOCK_SIZE + 3]
+
+
+def random_doc_ids(rng:random.Random, size:int) -> list[int]:
+    return sorted(rng.sample(range(rng.choice([2 * size + 1, 100 * size + 1])), size))
+
+
+def block_cursor(doc_ids:list[int], blocks:list | None=None) -> BlockCursor:
+    buf = encode_postings([Posting(doc_id, 1, [0]) for doc_id in doc_ids])
+    return BlockCursor(buf, [doc_id / 2 for doc_id in doc_ids], blocks=blocks)
+
+
+def check_moves(rng:random.Random, doc_ids:list[int], cursor:PostingsCursor) -> None:
+    """makes random next() and seek() moves, checking each against a plain index into doc_ids"""
+    assert len(cursor) == len(doc_ids)
+    position = 0
+    for _ in range(3 * len(doc_ids) + 5):
+        if rng.random() < 0.3:
+            doc_id = cursor.next()
+            position = min(position + 1, len(doc_ids))
+        else:
+            target = rng.randint(0, (doc_ids[-1] if doc_ids else 0) + 3)
+            doc_id = cursor.seek(target)
+            if position < len(doc_ids) and doc_ids[position] < target: # seek never moves backwards
+                position = bisect_left(doc_ids, target, position)
+        expected = doc_ids[position] if position < len(doc_ids) else END_OF_POSTINGS
+        assert doc_id == cursor.doc_id == expected
+        if expected != END_OF_POSTINGS:
+            assert cursor.posting_number == position
+            assert cursor.weight == doc_ids[position] / 2
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("seed", range(20))
+def test_block_cursor_moves_like_a_list_cursor(size, seed):
+    rng = random.Random(seed)
+    doc_ids = random_doc_ids(rng, size)
+    check_moves(random.Random(seed), doc_ids, PostingsCursor(doc_ids, [doc_id / 2 for doc_id in doc_ids]))
+    check_moves(random.Random(seed), doc_ids, block_cursor(doc_ids))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_block_cursors_sharing_blocks(seed):
+    """cursors sharing a list's decoded blocks (as through the postings cache) see the same docIDs"""
+    rng = random.Random(seed)
+    doc_ids = random_doc_ids(rng, 5 * BLOCK_SIZE + 3)
+    blocks = [None] * len(decode_skips(encode_postings([Posting(doc_id, 1, [0]) for doc_id in doc_ids]))[1])
+    for _ in range(3):
+        check_moves(rng, doc_ids, block_cursor(doc_ids, blocks))
+    assert all(block is None or block == doc_ids[i * BLOCK_SIZE:(i + 1) * BLOCK_SIZE] for i, block in enumerate(blocks))
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_intersect_is_set_intersection(seed):
+    rng = random.Random(seed)
+    lists = [random_doc_ids(rng, rng.choice(SIZES)) for _ in range(rng.randint(1, 4))]
+    expected = sorted(set(lists[0]).intersection(*lists[1:]))
+    cursors = [block_cursor(doc_ids) if rng.random() < 0.5 else PostingsCursor(doc_ids, doc_ids) for doc_ids in lists]
+    assert list(intersect(cursors)) == expected
+    assert list(intersect([])) == []
@@ -0,0 +1,117 @@
+"""Round trips through the binary postings format (see indexer/postings.py)."""
+import io
+import random
+
+import pytest
+
+from conftest import postings_of
+from postings import (encode_varint, decode_varints, encode_postings, decode_postings, decode_doc_ids, decode_df,
+                      merge_encoded, write_run, read_run, IndexWriter, IndexReader, PositionReader, BLOCK_SIZE)
+from reader import Posting, FIELDS
+
+# list lengths either side of a block boundary, and a few blocks long
+SIZES = [0, 1, 2, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, 3 * BLOCK_SIZE, 1000]
+
+
+def random_postings(rng:random.Random, size:int, first:int=0) -> list[Posting]:
+    """size docID-sorted postings, from docID first on, with random positions and field frequencies"""
+    postings = []
+    doc_id = first
+    for _ in range(size):
+        doc_id += rng.choice([1, 1, 2, rng.randint(1, 100_000)])
+        positions = sorted(rng.sample(range(rng.choice([100, 100_000])), rng.randint(1, 8)))
+        field_frequencies = None
+        if rng.random() < 0.5:
+            field_frequencies = [rng.choice([0, 0, 1, 300]) for _ in FIELDS]
+        postings.append(Posting(doc_id, len(positions), positions, field_frequencies if any(field_frequencies or []) else None))
+    return postings
+
+
+def as_tuples(postings:list[Posting]) -> list[tuple]:
+    return [(p.document_id, p.term_frequency, p.positions, p.field_frequencies) for p in postings]
+
+
+def test_varints_round_trip():
+    values = [0, 1, 0x7f, 0x80, 0x3fff, 0x4000, 2 ** 32 - 1, 2 ** 63]
+    out = bytearray()
+    for value in values:
+        encode_varint(value, out)
+    decoded, pos = decode_varints(out, 0, len(values))
+    assert decoded == values
+    assert pos == len(out)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_postings_round_trip(size):
+    postings = random_postings(random.Random(size), size)
+    encoded = encode_postings(postings)
+    assert as_tuples(decode_postings(encoded)) == as_tuples(postings)
+    assert decode_doc_ids(encoded) == [posting.document_id for posting in postings]
+    assert decode_df(encoded) == size
+
+
+@pytest.mark.parametrize("size", SIZES[1:])
+@pytest.mark.parametrize("seed", range(5))
+def test_position_reader_reads_postings_in_increasing_order(size, seed):
+    rng = random.Random(seed)
+    postings = random_postings(rng, size)
+    reader = PositionReader(encode_postings(postings))
+    asked = sorted(rng.sample(range(size), rng.randint(1, min(size, 50))))
+    for posting_number in asked:
+        assert reader.positions(posting_number) == postings[posting_number].positions
+    if asked[-1]:
+        with pytest.raises(ValueError): # it only reads forwards
+            reader.positions(asked[-1] - 1)
+
+
+def test_run_file_round_trip(tmp_path):
+    rng = random.Random(0)
+    postings = {term: random_postings(rng, size) for term, size in zip(["b", "a", "é", "c"], [1, 300, 7, 129])}
+    write_run(tmp_path / "run.bin", postings)
+    records = list(read_run(tmp_path / "run.bin"))
+    assert [term for term, _ in records] == sorted(postings)
+    for term, buf in records:
+        assert as_tuples(decode_postings(buf)) == as_tuples(postings[term])
+
+
+def test_index_round_trip(corpus, tmp_path):
+    postings = postings_of(corpus)
+    paths = {name: str(tmp_path / f"{name}.bin") for name in ("index", "lexicon", "weights", "champions")}
+    with IndexWriter(paths["index"], paths["lexicon"], paths["weights"]) as writer:
+        for term in sorted(postings):
+            writer.add(term, postings[term], len(postings[term]) / 10)
+    with IndexReader(paths["index"], paths["lexicon"], paths["weights"], paths["champions"]) as index:
+        assert list(index) == sorted(postings)
+        assert index.posting_count() == sum(len(term_postings) for term_postings in postings.values())
+        for term, term_postings in postings.items():
+            assert term in index
+            assert index.df(term) == len(term_postings)
+            assert index.idf(term) == pytest.approx(len(term_postings) / 10)
+            assert index.doc_ids(term) == [posting.document_id for posting in term_postings]
+            assert as_tuples(index.postings(term)) == as_tuples(term_postings)
+        assert "missing" not in index
+        assert index.df("missing") == 0
+        assert index.postings("missing") == []
+
+
+def test_index_writer_wants_sorted_terms(tmp_path):
+    with IndexWriter(str(tmp_path / "index.bin"), str(tmp_path / "lexicon.bin"), str(tmp_path / "weights.bin")) as writer:
+        writer.add("b", [Posting(0, 1, [0])], 0.0)
+        with pytest.raises(ValueError):
+            writer.add("a", [Posting(0, 1, [0])], 0.0)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_merge_encoded_is_the_encoding_of_the_concatenated_lists(seed):
+    """merging runs' encoded lists gives exactly what encoding all of their postings at once would"""
+    rng = random.Random(seed)
+    runs = []
+    last = 0
+    for _ in range(rng.randint(0, 5)):
+        runs.append(random_postings(rng, rng.choice(SIZES + [rng.randint(0, 700)]), last))
+        last = runs[-1][-1].document_id if runs[-1] else last
+    out = io.BytesIO()
+    df, length = merge_encoded([memoryview(encode_postings(run)) for run in runs], out)
+    expected = encode_postings([posting for run in runs for posting in run])
+    assert out.getvalue() == expected
+    assert (df, length) == (decode_df(expected), len(expected))
@@ -0,0 +1,98 @@
+"""Top-k retrieval (see indexer/ranker.py), checked against scoring every document."""
+import random
+
+import pytest
+
+import impacts
+import ranker
+from conftest import VOCABULARY, DOCUMENTS
+from postings import IndexReader
+
+K = 10
+
+
+def exhaustive_scores(query:dict[str, float], index, doc_norms, static_scores, beta:float) -> dict[int, float]:
+    """docID -> beta * cosine_sim(q, d) + static_scores[d] of every document sharing a term with the query"""
+    cosine_sims = dict()
+    for term, qi in query.items():
+        for doc_id, weight in zip(index.doc_ids(term), index.weights(term)):
+            cosine_sims[doc_id] = cosine_sims.get(doc_id, 0.0) + qi * weight
+    return {doc_id: beta * cosine_sim / doc_norms[doc_id] + static_scores[doc_id]
+            for doc_id, cosine_sim in cosine_sims.items() if cosine_sim and doc_norms[doc_id]}
+
+
+def random_query(rng:random.Random, index) -> dict[str, float]:
+    terms = rng.sample(VOCABULARY, rng.randint(1, 4))
+    return ranker.query_weights(terms, {term: index.idf(term) for term in terms})
+
+
+def test_wand_finds_the_exhaustive_top_k(index):
+    rng = random.Random(0)
+    doc_norms = ranker.load_doc_norms()
+    for static_scale in (0.0, 0.01, 1.0): # from none to static scores outweighing the cosine similarities
+        static_scores = [static_scale * rng.random() for _ in range(DOCUMENTS)]
+        for _ in range(40):
+            query = random_query(rng, index)
+            scores = exhaustive_scores(query, index, doc_norms, static_scores, ranker.BETA)
+            expected = sorted(scores.values(), reverse=True)[:K]
+            for static_bound in (None, max(static_scores)):
+                top = ranker.wand_top_k(query, index, doc_norms, K, static_scores, ranker.BETA,
+                                        static_bound=static_bound)
+                assert [score for score, _ in top] == pytest.approx(expected)
+                assert all(scores[doc_id] == pytest.approx(score) for score, doc_id in top)
+
+
+
+def test_champion_lists_hold_a_terms_top_k(index, monkeypatch):
+    """a champion list is the postings the engine would rank highest for its term alone,
+    static scores included, so a one term query over it finds the exhaustive top k"""
+    rng = random.Random(1)
+    monkeypatch.setattr(impacts, "CHAMPION_SIZE", 2 * K)
+    ranker.write_pagerank([rng.random() / 10 for _ in range(DOCUMENTS)])
+    ranker.write_authorities([rng.random() / 10 for _ in range(DOCUMENTS // 2)]) # not every document has one
+    impacts.refresh_champions(shard_count=2)
+    static_scores = ranker.static_scores(ranker.load_pagerank(), ranker.load_authorities())
+    doc_norms = ranker.load_doc_norms()
+    with IndexReader() as champion_index:
+        assert any(len(champion_index.champion_cursor(term)) < champion_index.df(term) for term in VOCABULARY)
+        for term in VOCABULARY:
+            query = ranker.query_weights([term], {term: champion_index.idf(term)})
+            scores = exhaustive_scores(query, champion_index, doc_norms, static_scores, ranker.BETA)
+            top = ranker.wand_top_k(query, champion_index, doc_norms, K, static_scores, ranker.BETA, champions=True)
+            assert [score for score, _ in top] == pytest.approx(sorted(scores.values(), reverse=True)[:K])
+
+
+def has_phrase(tokens:list[str], phrase:list[tuple[str, int]]) -> bool:
+    return any(all(start + offset < len(tokens) and tokens[start + offset] == term for term, offset in phrase)
+               for start in range(len(tokens)))
+
+
+def random_phrase(rng:random.Random, tokens:list[str]) -> list[tuple[str, int]]:
+    """a few of the tokens of a window of a document (so it's in at least that one), each with its offset in the window"""
+    start = rng.randrange(len(tokens))
+    window = tokens[start:start + rng.randint(2, 4)]
+    offsets = sorted(rng.sample(range(len(window)), rng.randint(1, len(window))))
+    return [(window[offset], offset - offsets[0]) for offset in offsets]
+
+
+def test_phrase_queries_match_the_documents_holding_the_phrases(index, corpus):
+    rng = random.Random(0)
+    doc_norms = ranker.load_doc_norms()
+    static_scores = [rng.random() / 100 for _ in range(DOCUMENTS)]
+    for _ in range(100):
+        tokens = rng.choice(corpus)
+        phrases = [random_phrase(rng, tokens) for _ in range(rng.choice([1, 1, 2]))]
+        phrase_terms = [term for phrase in phrases for term, _ in phrase]
+        terms = phrase_terms + rng.sample(VOCABULARY, rng.randint(0, 2))
+        query = ranker.query_weights(terms, {term: index.idf(term) for term in terms})
+        if rng.random() < 0.3: # as query_weights leaves out a term that's in every document
+            query.pop(rng.choice(phrase_terms), None)
+        conjunctive = rng.random() < 0.5 # an AND query requires the rest of its terms too
+        scores = exhaustive_scores(query, index, doc_norms, static_scores, ranker.BETA)
+        matches = {doc_id for doc_id, doc_tokens in enumerate(corpus)
+                   if all(has_phrase(doc_tokens, phrase) for phrase in phrases)
+                   and (not conjunctive or all(term in doc_tokens for term in query))}
+        top = ranker.conjunctive_top_k(query, index, doc_norms, len(matches) + 1, static_scores, ranker.BETA,
+                                       None if conjunctive else [], phrases)
+        assert {doc_id for _, doc_id in top} == matches
+        assert all(scores.get(doc_id, static_scores[doc_id]) == pytest.approx(score) for score, doc_id in top)
@@ -0,0 +1,155 @@
+"""The frontier's append-only store (see crawler/store.py): replaying its log, and compacting it."""
+import importlib.util
+import os
+import sys
+from hashlib import sha256
+
+import pytest
+
+from conftest import ROOT
+
+
+def load_crawler_module(name:str):
+    """a crawler module, loaded without crawler/__init__ (which starts up the whole crawler: its utils, the scraper...)"""
+    spec = importlib.util.spec_from_file_location(f"crawler.{name}", os.path.join(ROOT, "crawler", f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+load_crawler_module("seen") # which store.py imports
+store_module = load_crawler_module("store")
+FrontierStore = store_module.FrontierStore
+
+
+def url(i:int) -> str:
+    return f"https://example.com/{i}"
+
+
+def urlhash(i:int) -> str:
+    """hex, like the frontier's URL hashes (the seen set fingerprints them)"""
+    return sha256(url(i).encode()).hexdigest()
+
+
+def record(i:int) -> str:
+    return f"A\t{urlhash(i)}\t{url(i)}"
+
+
+def crash(store) -> None:
+    """stops a store the way a killed crawler would: without flushing or compacting"""
+    store.closed.set()
+    store.flusher.join()
+    store.log.close()
+
+
+def log_lines(path) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / "frontier.log")
+
+
+def test_replay_restores_the_last_record_of_every_url(path):
+    store = FrontierStore(path)
+    for i in range(10):
+        store[urlhash(i)] = (url(i), False)
+    for i in range(0, 10, 3):
+        store[urlhash(i)] = (url(i), True)
+    store.sync()
+    crash(store)
+    assert len(log_lines(path)) == 14 # not compacted
+
+    store = FrontierStore(path)
+    assert sorted(store.pending()) == sorted(url(i) for i in range(10) if i % 3)
+    assert all(urlhash(i) in store for i in range(10))
+    assert urlhash(10) not in store
+    assert len(store) == 10
+    store.close()
+
+
+def test_records_are_only_written_once_their_group_is_committed(path):
+    store = FrontierStore(path, group_records=3, group_interval=60)
+    store[urlhash(0)] = (url(0), False)
+    store[urlhash(1)] = (url(1), False)
+    assert urlhash(0) in store # the in-memory state doesn't wait for the group
+    assert log_lines(path) == []
+    store[urlhash(2)] = (url(2), False)
+    assert len(log_lines(path)) == 3
+    store[urlhash(3)] = (url(3), False)
+    crash(store)
+    assert sorted(FrontierStore(path).pending()) == [url(0), url(1), url(2)]
+
+
+def test_replay_drops_a_torn_last_record(path):
+    store = FrontierStore(path)
+    store[urlhash(0)] = (url(0), False)
+    store.sync()
+    crash(store)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(record(1)[:-5]) # a crash mid-group
+
+    store = FrontierStore(path)
+    assert store.pending() == [url(0)]
+    assert urlhash(1) not in store
+    store[urlhash(2)] = (url(2), False)
+    store.sync()
+    crash(store)
+    assert log_lines(path) == [record(0), record(2)]
+    assert sorted(FrontierStore(path).pending()) == [url(0), url(2)]
+
+
+def test_replay_skips_malformed_records(path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"{record(0)}\nhttps://example.com/broken\n{record(1)}\n")
+    store = FrontierStore(path)
+    assert sorted(store.pending()) == [url(0), url(1)]
+    assert len(store) == 2
+    store.close()
+
+
+def test_compaction_keeps_the_seen_set_and_rewrites_the_pending_urls(path, monkeypatch):
+    monkeypatch.setattr(store_module, "COMPACTION_MIN_RECORDS", 20)
+    store = FrontierStore(path, group_records=1)
+    for i in range(30):
+        store[urlhash(i)] = (url(i), False)
+    for i in range(25):
+        store[urlhash(i)] = (url(i), True)
+    # compacted once the log got to COMPACTION_RATIO records per pending URL
+    assert len(log_lines(path)) < 30
+    crash(store)
+
+    store = FrontierStore(path)
+    assert sorted(store.pending()) == sorted(url(i) for i in range(25, 30))
+    assert all(urlhash(i) in store for i in range(30)) # the completed ones came back from the seen set
+    assert len(store) == 30
+    store.close()
+
+
+def test_close_compacts(path):
+    store = FrontierStore(path)
+    for i in range(5):
+        store[urlhash(i)] = (url(i), i < 3)
+    store.close()
+    assert log_lines(path) == [record(3), record(4)]
+
+    store = FrontierStore(path)
+    assert sorted(store.pending()) == [url(3), url(4)]
+    assert all(urlhash(i) in store for i in range(5))
+    store.close()
+
+
+def test_delete(path):
+    store = FrontierStore(path)
+    store[urlhash(0)] = (url(0), False)
+    store.close()
+    store_module.delete(path)
+    store = FrontierStore(path)
+    assert store.pending() == []
+    assert urlhash(0) not in store
+    store.close()
+    store_module.delete(path)
+    store_module.delete(path) # nothing left to delete